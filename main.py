@@ -3,10 +3,22 @@ import sys
 import os
 import random
 import math
+import asyncio
+import gc
+import hashlib
+import io
+import json
+import time
+import argparse
+import threading
+import contextlib
+import struct
+import wave
 import pygame_gui as gui
 from pygame.locals import *
 import pygame.mask
 import numpy
+from collections import OrderedDict, deque
 
 # 初始化Pygame
 pygame.init()
@@ -40,27 +52,63 @@ RED = (255, 0, 0)
 BLACK = (0, 0, 0)
 YELLOW = (255, 255, 0)
 BLUE = (0, 0, 255)
+HIT_TINT = (255, 0, 0, 100)  # 受击时的半透明红色
 
 # 物理参数
 GRAVITY = 1.0  # 调整重力
 JUMP_SPEED = -18  # 调整跳跃速度
 GROUND_HEIGHT = WINDOW_HEIGHT - 100
 
+# 时间参数：模拟以固定步长推进，渲染帧率可以不同
+FPS = 60
+TIME_STEP_MS = 1000 / FPS
+MAX_STEPS_PER_FRAME = 5  # 掉帧时每帧最多追赶的模拟步数
+
 # 游戏参数
 CAMERA_THRESHOLD_X = WINDOW_WIDTH * 0.4  # 调整相机阈值
 BOSS_APPEAR_DISTANCE = WINDOW_WIDTH * 1.5  # 再次提前BOSS出现时机
 
-# 创建简单的音效
-shoot_sound = pygame.mixer.Sound(pygame.sndarray.array(numpy.random.rand(4410).astype(numpy.float32)))
-hit_sound = pygame.mixer.Sound(pygame.sndarray.array(numpy.random.rand(4410).astype(numpy.float32)))
-jump_sound = pygame.mixer.Sound(pygame.sndarray.array(numpy.random.rand(4410).astype(numpy.float32)))
-boss_sound = pygame.mixer.Sound(pygame.sndarray.array(numpy.random.rand(8820).astype(numpy.float32)))
+# 音效参数：波形(square/noise)、起止频率(Hz，噪声为采样保持频率)、时长(秒)、
+# 起音时间、指数衰减时间常数、方波占空比、叠加白噪声的比例；
+# 以及播放音量、最短播放间隔(ms)和为该音效保留的声道数
+SOUND_SPECS = {
+    'shoot': {'wave': 'square', 'freq': (1200, 500), 'duration': 0.09, 'attack': 0.002,
+              'decay': 0.03, 'duty': 0.25, 'noise': 0.0,
+              'volume': 0.1, 'interval': 50, 'channels': 2},
+    'hit': {'wave': 'noise', 'freq': (4000, 1000), 'duration': 0.12, 'attack': 0.001,
+            'decay': 0.04, 'duty': 0.5, 'noise': 0.0,
+            'volume': 0.2, 'interval': 40, 'channels': 2},
+    'jump': {'wave': 'square', 'freq': (250, 600), 'duration': 0.16, 'attack': 0.005,
+             'decay': 0.08, 'duty': 0.5, 'noise': 0.0,
+             'volume': 0.15, 'interval': 100, 'channels': 1},
+    'boss': {'wave': 'square', 'freq': (110, 55), 'duration': 0.8, 'attack': 0.02,
+             'decay': 0.35, 'duty': 0.5, 'noise': 0.35,
+             'volume': 0.3, 'interval': 1000, 'channels': 1},
+    'pickup': {'wave': 'square', 'freq': (600, 1400), 'duration': 0.12, 'attack': 0.002,
+               'decay': 0.06, 'duty': 0.5, 'noise': 0.0,
+               'volume': 0.15, 'interval': 80, 'channels': 1},
+}
+# 参与合成的参数，决定缓存文件名
+SOUND_SYNTH_FIELDS = ('wave', 'freq', 'duration', 'attack', 'decay', 'duty', 'noise')
+# 合成音效的缓存目录
+SFX_CACHE_DIR = 'build/sfx-cache'
 
-# 调整音量
-shoot_sound.set_volume(0.1)
-hit_sound.set_volume(0.2)
-jump_sound.set_volume(0.15)
-boss_sound.set_volume(0.3)
+# 精灵表定义：(名称, 文件, 列数, 行数, 缩放, 是否水平翻转)
+SPRITE_SHEETS = [
+    ('trump_idle', 'assets/Trump idle.png', 4, 1, 0.5, False),  # Trump动画 - 从0.7改为0.5
+    ('trump_run', 'assets/Trump run.png', 4, 1, 0.5, False),
+    ('boss_idle', 'assets/BOSS idle.png', 4, 1, 1.5, True),  # BOSS朝左
+    ('boss_walk', 'assets/boss walk.png', 4, 1, 1.5, True),
+    ('minion_walk', 'assets/boss walk.png', 4, 1, 0.6, True),  # 小兵：缩小的BOSS
+]
+# 由上面的动画派生的变体：(名称, 来源, 变换)
+SPRITE_VARIANTS = [
+    ('trump_idle_left', 'trump_idle', 'flip'),
+    ('trump_run_left', 'trump_run', 'flip'),
+    ('boss_idle_hit', 'boss_idle', 'hit'),
+    ('boss_walk_hit', 'boss_walk', 'hit'),
+    ('minion_walk_hit', 'minion_walk', 'hit'),
+]
 
 # 加载图片资源
 def load_sprite_sheet(filename, cols, rows, scale=1.0):
@@ -83,114 +131,837 @@ def load_sprite_sheet(filename, cols, rows, scale=1.0):
             frames.append(frame)
     return frames
 
+def flip_frames(frames):
+    # 生成水平翻转后的帧列表
+    return [pygame.transform.flip(frame, True, False) for frame in frames]
+
+def tint_frames(frames, color):
+    # 生成乘以指定颜色后的帧列表（用于受击闪红）
+    tinted = []
+    for frame in frames:
+        surface = frame.copy()
+        surface.fill(color, special_flags=pygame.BLEND_RGBA_MULT)
+        tinted.append(surface)
+    return tinted
+
+# 分析器统计的主循环阶段（CSV追踪文件的列顺序）
+PROFILE_STAGES = ('events', 'ui_update', 'sim_move', 'sim_world', 'sim_player', 'sim_boss', 'sim_entities',
+                  'sim_collision',
+                  'draw_backdrop', 'draw_sprites', 'draw_overlay', 'upscale', 'present')
+
+class ProfileSection:
+    # 可复用的计时区段，避免每次计时都创建新对象
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, (time.perf_counter() - self.start) * 1000)
+        return False
+
+class FrameProfiler:
+    # 帧分析器：统计主循环每个阶段的耗时、滚动的帧时间分位数、实体数量和Surface分配次数，
+    # 以缓存的浮层显示，并可逐帧写入JSONL或CSV追踪文件。关闭时所有调用都是空操作。
+    def __init__(self, window=300):
+        self.enabled = False
+        self.null_section = contextlib.nullcontext()
+        self.sections = {}
+        self.frame_times = deque(maxlen=window)
+        self.stage_ms = {}
+        self.counts = {}
+        self.frame = 0
+        self.frame_start = 0.0
+        self.blocks_start = 0
+        self.started = False  # 本帧是否在启用状态下调用过begin_frame
+        self.last = None
+        self.trace = None
+        self.trace_csv = False
+        self.overlay = None
+        self.overlay_time = 0.0
+        self.overlay_interval = 0.25  # 浮层每秒刷新4次
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.frame_times.clear()
+        # 切换发生在帧中间，这一帧没有起点，不记录
+        self.started = False
+        self.stage_ms = {}
+        self.counts = {}
+
+    def section(self, name):
+        if not self.enabled:
+            return self.null_section
+        section = self.sections.get(name)
+        if section is None:
+            section = ProfileSection(self, name)
+            self.sections[name] = section
+        return section
+
+    def add(self, name, ms):
+        # 每帧可能执行多个模拟步，同一阶段的耗时累加
+        self.stage_ms[name] = self.stage_ms.get(name, 0.0) + ms
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def begin_frame(self):
+        if self.enabled:
+            self.frame_start = time.perf_counter()
+            self.blocks_start = sys.getallocatedblocks()
+            self.started = True
+
+    def end_frame(self, entities):
+        if not self.enabled or not self.started:
+            return
+        self.started = False
+        frame_ms = (time.perf_counter() - self.frame_start) * 1000
+        self.frame_times.append(frame_ms)
+        self.frame += 1
+        record = {
+            'frame': self.frame,
+            'frame_ms': round(frame_ms, 3),
+            'stages': {name: round(ms, 3) for name, ms in self.stage_ms.items()},
+            'entities': entities,
+            'surfaces': self.counts.get('surfaces', 0),
+            'py_blocks': sys.getallocatedblocks() - self.blocks_start,
+        }
+        if frame_ms > TIME_STEP_MS and self.stage_ms:
+            # 超出16.6ms预算时记录最慢的阶段
+            record['over_budget'] = max(self.stage_ms, key=self.stage_ms.get)
+        self.last = record
+        if self.trace is not None:
+            self.write_trace(record)
+        self.stage_ms = {}
+        self.counts = {}
+
+    def percentiles(self):
+        times = sorted(self.frame_times)
+        if not times:
+            return 0.0, 0.0, 0.0
+        last = len(times) - 1
+        return times[last // 2], times[int(last * 0.95)], times[int(last * 0.99)]
+
+    def open_trace(self, path):
+        self.trace_csv = path.endswith('.csv')
+        self.trace = open(path, 'w')
+        if self.trace_csv:
+            columns = ['frame', 'frame_ms'] + list(PROFILE_STAGES) + [
+                'bullets', 'projectiles', 'bullet_hit_rate', 'projectile_hit_rate',
+                'surfaces', 'py_blocks', 'over_budget']
+            self.trace.write(','.join(columns) + '\n')
+
+    def write_trace(self, record):
+        if self.trace_csv:
+            stages = record['stages']
+            row = [record['frame'], record['frame_ms']]
+            row += [stages.get(name, 0) for name in PROFILE_STAGES]
+            entities = record['entities']
+            row += [entities.get('bullets', 0), entities.get('projectiles', 0),
+                    entities.get('bullet_hit_rate', ''), entities.get('projectile_hit_rate', ''),
+                    record['surfaces'], record['py_blocks'], record.get('over_budget', '')]
+            self.trace.write(','.join(str(value) for value in row) + '\n')
+        else:
+            self.trace.write(json.dumps(record) + '\n')
+
+    def close_trace(self):
+        if self.trace is not None:
+            self.trace.close()
+            self.trace = None
+
+    def draw(self, surface, text_cache):
+        # 浮层只按固定间隔重新渲染，其余帧直接blit缓存
+        now = time.perf_counter()
+        if self.overlay is None or now - self.overlay_time > self.overlay_interval:
+            self.overlay_time = now
+            self.overlay = self.render_overlay(text_cache)
+        return surface.blit(self.overlay, (10, 40))
+
+    def render_overlay(self, text_cache):
+        font = text_cache.font(20)
+        p50, p95, p99 = self.percentiles()
+        lines = [(f"frame p50 {p50:.2f}  p95 {p95:.2f}  p99 {p99:.2f} ms",
+                  RED if p95 > TIME_STEP_MS else WHITE)]
+        last = self.last
+        if last is not None:
+            for name in PROFILE_STAGES:
+                if name in last['stages']:
+                    color = RED if name == last.get('over_budget') else WHITE
+                    lines.append((f"{name:14s} {last['stages'][name]:6.2f} ms", color))
+            entities = last['entities']
+            lines.append((f"bullets {entities.get('bullets', 0)}  projectiles {entities.get('projectiles', 0)}  "
+                          f"minions {entities.get('minions', 0)}  chunks {entities.get('chunks', 0)}", YELLOW))
+            lines.append((f"pool hit  bullets {entities.get('bullet_hit_rate', 1.0):.1%}  "
+                          f"projectiles {entities.get('projectile_hit_rate', 1.0):.1%}", YELLOW))
+            lines.append((f"surfaces {last['surfaces']}  py blocks {last['py_blocks']:+d}", YELLOW))
+        line_height = font.get_linesize()
+        overlay = pygame.Surface((320, line_height * len(lines) + 8), pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, 160))
+        for i, (text, color) in enumerate(lines):
+            overlay.blit(font.render(text, True, color), (4, 4 + i * line_height))
+        self.count('surfaces', len(lines) + 1)
+        return overlay
+
+# 全局分析器，默认关闭（F3切换）
+profiler = FrameProfiler()
+
+class TextCache:
+    # 文字渲染缓存：每个字号的Font只创建一次，
+    # 渲染好的Surface按 (文字, 字号, 颜色) 缓存，超出容量时淘汰最久未使用的
+    def __init__(self, max_entries=128):
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+        self.max_entries = max_entries
+
+    def font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            font = pygame.font.Font(None, size)
+            self.fonts[size] = font
+        return font
+
+    def render(self, text, size, color):
+        key = (text, size, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+        surface = self.font(size).render(text, True, color)
+        profiler.count('surfaces')
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
+
+def load_sprite_frames(sheets=SPRITE_SHEETS, variants=SPRITE_VARIANTS):
+    # 按SPRITE_SHEETS和SPRITE_VARIANTS生成所有动画帧（已缩放、翻转、着色），每个动画一个列表。
+    # 每加载一张精灵表yield一次，网页端可以在两张之间让出事件循环；
+    # 用yield from调用，返回值是 {动画名: 帧列表}
+    sequences = {}
+    for name, filename, cols, rows, scale, flip in sheets:
+        frames = load_sprite_sheet(filename, cols, rows, scale)
+        sequences[name] = flip_frames(frames) if flip else frames
+        yield
+    for name, source, transform in variants:
+        if transform == 'flip':
+            sequences[name] = flip_frames(sequences[source])
+        else:
+            sequences[name] = tint_frames(sequences[source], HIT_TINT)
+    return sequences
+
+def synthesize_sound(spec, rate, seed=0):
+    # 向量化合成单声道音效，返回[-1, 1]范围的float数组
+    n = int(spec['duration'] * rate)
+    t = numpy.arange(n) / rate
+    # 线性扫频，相位为频率的累积（单位：周期）
+    freq = numpy.linspace(spec['freq'][0], spec['freq'][1], n)
+    phase = numpy.cumsum(freq) / rate
+    rng = numpy.random.default_rng(seed)
+    if spec['wave'] == 'square':
+        samples = numpy.where(phase % 1.0 < spec['duty'], 1.0, -1.0)
+    else:
+        # 每个周期取一个随机值并保持，频率越低噪声越“粗”
+        steps = phase.astype(numpy.int64)
+        samples = rng.uniform(-1.0, 1.0, steps[-1] + 1)[steps]
+    if spec['noise']:
+        samples = samples * (1.0 - spec['noise']) + rng.uniform(-1.0, 1.0, n) * spec['noise']
+    # 包络：线性起音 + 指数衰减，结尾5ms淡出避免爆音
+    envelope = numpy.minimum(t / spec['attack'], 1.0) * numpy.exp(-t / spec['decay'])
+    envelope *= numpy.clip((spec['duration'] - t) / 0.005, 0.0, 1.0)
+    return samples * envelope
+
+def load_sounds(specs=SOUND_SPECS, cache_dir=SFX_CACHE_DIR):
+    # 合成结果按参数和混音器采样率的哈希缓存为WAV，之后启动直接读取
+    rate = pygame.mixer.get_init()[0]
+    sounds = {}
+    for name, spec in specs.items():
+        params = tuple((field, spec[field]) for field in SOUND_SYNTH_FIELDS)
+        key = hashlib.sha1(repr((params, rate)).encode()).hexdigest()
+        path = os.path.join(cache_dir, key + '.wav')
+        sound = None
+        if os.path.exists(path):
+            try:
+                sound = pygame.mixer.Sound(path)
+            except pygame.error:
+                pass  # 缓存损坏时重新合成
+        if sound is None:
+            samples = synthesize_sound(spec, rate, seed=int(key[:8], 16))
+            pcm = (samples * 32767 * 0.8).astype(numpy.int16)
+            data = io.BytesIO()
+            with wave.open(data, 'wb') as f:
+                f.setnchannels(1)
+                f.setsampwidth(2)
+                f.setframerate(rate)
+                f.writeframes(pcm.tobytes())
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                with open(path, 'wb') as f:
+                    f.write(data.getvalue())
+            except OSError:
+                pass  # 无法写入缓存时只是下次重新合成
+            data.seek(0)
+            sound = pygame.mixer.Sound(file=data)
+        sound.set_volume(spec['volume'])
+        sounds[name] = sound
+    return sounds
+
+class AudioMixer:
+    # 为每种音效保留固定的声道，密集的射击音效只会在自己的声道里互相替换，
+    # 不会抢走BOSS出场音效的声道；同一音效在最短间隔内只播放一次
+    def __init__(self, specs=SOUND_SPECS):
+        self.specs = specs
+        self.sounds = {}
+        self.last_played = {}
+        self.next_channel = {}
+        self.channels = {}
+        reserved = sum(spec['channels'] for spec in specs.values())
+        # 保留声道之外至少留几个给其他用途
+        if pygame.mixer.get_num_channels() < reserved + 4:
+            pygame.mixer.set_num_channels(reserved + 4)
+        pygame.mixer.set_reserved(reserved)
+        index = 0
+        for name, spec in specs.items():
+            self.channels[name] = [pygame.mixer.Channel(index + i) for i in range(spec['channels'])]
+            self.next_channel[name] = 0
+            index += spec['channels']
+
+    def attach(self, sounds):
+        self.sounds = sounds
+
+    def play(self, name, now):
+        sound = self.sounds.get(name)
+        if sound is None:
+            return False
+        last = self.last_played.get(name)
+        if last is not None and now - last < self.specs[name]['interval']:
+            return False
+        channels = self.channels[name]
+        for channel in channels:
+            if not channel.get_busy():
+                break
+        else:
+            # 声道都在播放时轮流打断最早的那个
+            i = self.next_channel[name]
+            channel = channels[i]
+            self.next_channel[name] = (i + 1) % len(channels)
+        channel.play(sound)
+        self.last_played[name] = now
+        return True
+
 class PixelUI:
-    def __init__(self):
-        self.font = pygame.font.Font(None, 36)  # 使用像素字体
+    def __init__(self, text_cache):
+        self.text = text_cache
+        self.font_size = 36  # 使用像素字体
         self.health_border_width = 2
         self.health_height = 20
         self.health_padding = 2
+        self.health_bars = {}  # (x, y) -> (血条参数, 缓存的血条Surface, 绘制偏移)
         
     def draw_health_bar(self, surface, x, y, width, current, maximum, color):
+        # 血量不变时直接绘制缓存的整条血条
+        key = (width, current, maximum, color)
+        cached = self.health_bars.get((x, y))
+        if cached is None or cached[0] != key:
+            bar, offset_y = self.render_health_bar(width, current, maximum, color)
+            cached = (key, bar, offset_y)
+            self.health_bars[(x, y)] = cached
+        return surface.blit(cached[1], (x, y - cached[2]))
+
+    def render_health_bar(self, width, current, maximum, color):
+        # 血量文字比血条高，整个Surface按文字高度留出上下空间
+        text = f"{current}/{maximum}"
+        text_surface = self.text.render(text, self.font_size, WHITE)
+        height = max(self.health_height, text_surface.get_height())
+        offset_y = (height - self.health_height) // 2
+        bar = pygame.Surface((width, height), pygame.SRCALPHA)
+        profiler.count('surfaces')
+
         # 绘制外边框
-        border_rect = pygame.Rect(x, y, width, self.health_height)
-        pygame.draw.rect(surface, WHITE, border_rect, self.health_border_width)
+        border_rect = pygame.Rect(0, offset_y, width, self.health_height)
+        pygame.draw.rect(bar, WHITE, border_rect, self.health_border_width)
         
         # 绘制血量背景
         inner_rect = pygame.Rect(
-            x + self.health_padding,
-            y + self.health_padding,
+            self.health_padding,
+            offset_y + self.health_padding,
             width - 2 * self.health_padding,
             self.health_height - 2 * self.health_padding
         )
-        pygame.draw.rect(surface, BLACK, inner_rect)
+        pygame.draw.rect(bar, BLACK, inner_rect)
         
         # 绘制当前血量
-        health_width = (width - 2 * self.health_padding) * (current / maximum)
+        health_width = (width - 2 * self.health_padding) * (max(current, 0) / maximum)
         health_rect = pygame.Rect(
-            x + self.health_padding,
-            y + self.health_padding,
+            self.health_padding,
+            offset_y + self.health_padding,
             health_width,
             self.health_height - 2 * self.health_padding
         )
-        pygame.draw.rect(surface, color, health_rect)
+        pygame.draw.rect(bar, color, health_rect)
         
         # 绘制血量文字
-        text = f"{current}/{maximum}"
-        text_surface = self.font.render(text, True, WHITE)
         text_rect = text_surface.get_rect(center=border_rect.center)
-        surface.blit(text_surface, text_rect)
+        bar.blit(text_surface, text_rect)
+        return bar, offset_y
 
-class Background:
-    def __init__(self, image):
-        # 保持宽高比缩放，垂直填满屏幕
-        scale = WINDOW_HEIGHT / image.get_height()
+class ParallaxLayer:
+    # 一层视差背景：缩放后的图像预先横向拼接成“屏幕宽度+一块图”宽的长条，
+    # 每帧只需一次带area参数的blit；width为要覆盖的渲染目标宽度
+    def __init__(self, image, parallax_speed, height=WINDOW_HEIGHT, y=0, width=WINDOW_WIDTH):
+        # 保持宽高比缩放到指定高度
+        scale = height / image.get_height()
         new_width = int(image.get_width() * scale)
-        self.image = pygame.transform.scale(image, (new_width, WINDOW_HEIGHT))
+        self.image = pygame.transform.scale(image, (new_width, height))
         self.width = self.image.get_width()
-        self.parallax_speed = 0.5
+        self.parallax_speed = parallax_speed
+        self.y = y
         self.x = 0  # 当前平移偏移
-        
+
+        tiles = -(-width // self.width) + 1
+        if self.image.get_flags() & pygame.SRCALPHA:
+            self.strip = pygame.Surface((self.width * tiles, height), pygame.SRCALPHA)
+        else:
+            self.strip = pygame.Surface((self.width * tiles, height)).convert()
+        for i in range(tiles):
+            self.strip.blit(self.image, (i * self.width, 0))
+        self.area = pygame.Rect(0, 0, width, height)
+
     def update(self, camera_x):
         # 背景应与相机同向移动（略慢），正向偏移
         self.x = int(camera_x * self.parallax_speed) % self.width
-        
+
     def draw(self, screen):
-        start_x = -self.x
-        while start_x > -self.width:
-            start_x -= self.width
-        cur_x = start_x
-        while cur_x < WINDOW_WIDTH:
-            screen.blit(self.image, (cur_x, 0))
-            cur_x += self.width
-
-class Projectile:
-    def __init__(self, x, y, speed_x, speed_y=0, size=10, color=RED, projectile_type="normal"):
-        self.rect = pygame.Rect(x, y, size*2, size)  # 增大子弹尺寸
-        self.speed_x = speed_x
-        self.speed_y = speed_y
-        self.color = color
-        self.type = projectile_type
-        self.lifetime = 0
-        self.max_lifetime = 180  # 3秒 (60帧/秒)
-        
-    def update(self):
-        self.rect.x += self.speed_x
-        self.rect.y += self.speed_y
-        if self.type == "sine":
-            self.rect.y += math.sin(self.lifetime * 0.1) * 3
-        elif self.type == "homing":
-            # 蓄力效果
-            if self.lifetime < 30:
-                self.speed_x *= 0.95
-            else:
-                self.speed_x *= 1.1
-        self.lifetime += 1
-        
-    def draw(self, screen, rect_override=None):
-        draw_rect = rect_override if rect_override is not None else self.rect
-        if self.type == "normal":
-            pygame.draw.ellipse(screen, (255, 50, 50), draw_rect)
-            pygame.draw.ellipse(screen, (255, 200, 200), draw_rect, 2)
-        elif self.type == "sine":
-            glow_rect = draw_rect.inflate(8, 8)
-            pygame.draw.ellipse(screen, (100, 100, 255, 128), glow_rect)
-            pygame.draw.ellipse(screen, (50, 50, 255), draw_rect)
-            pygame.draw.ellipse(screen, (150, 150, 255), draw_rect, 2)
-        elif self.type == "homing":
+        self.area.x = self.x
+        screen.blit(self.strip, (0, self.y), self.area)
+
+class Background:
+    def __init__(self, image, width=WINDOW_WIDTH, height=WINDOW_HEIGHT):
+        # 最远的一层垂直填满渲染目标，更多的层可以用add_layer叠加在上面
+        self.width = width
+        self.height = height
+        self.layers = [ParallaxLayer(image, 0.5, height, width=width)]
+
+    def add_layer(self, image, parallax_speed, height=None, y=0):
+        # height和y按渲染目标的像素计，默认和渲染目标一样高
+        if height is None:
+            height = self.height
+        layer = ParallaxLayer(image, parallax_speed, height, y, self.width)
+        self.layers.append(layer)
+        return layer
+
+    def offsets(self):
+        # 所有层的平移偏移，用于判断背景是否需要重绘
+        return tuple(layer.x for layer in self.layers)
+
+    def update(self, camera_x):
+        for layer in self.layers:
+            layer.update(camera_x)
+
+    def draw(self, screen):
+        for layer in self.layers:
+            layer.draw(screen)
+
+# 低分辨率渲染目标的可选尺寸（宽高比与窗口相同）和放大方式
+LOW_RES_SIZES = ('320x180', '480x270', '640x360')
+UPSCALE_MODES = ('integer', 'nearest')
+
+class RenderView:
+    # 世界坐标（按窗口分辨率设计）到渲染目标的映射：scale为窗口像素与目标像素之比，
+    # frames把模拟用的全分辨率动画帧对应到目标分辨率下的同一帧
+    def __init__(self, scale=1, frames=None):
+        self.scale = scale
+        self.frames = frames if frames is not None else {}
+
+    def image(self, frame):
+        return self.frames.get(frame, frame)
+
+    def rect(self, rect):
+        if self.scale == 1:
+            return rect
+        scale = self.scale
+        return pygame.Rect(int(rect.x / scale), int(rect.y / scale),
+                           max(1, int(rect.width / scale)), max(1, int(rect.height / scale)))
+
+    def length(self, value):
+        # 线宽、边距等长度，至少1像素
+        return max(1, int(value / self.scale))
+
+# 直接绘制到窗口时使用的视图
+FULL_VIEW = RenderView()
+
+# 投射物类型编码（替代字符串比较）
+PROJ_NORMAL = 0
+PROJ_SINE = 1
+PROJ_HOMING = 2
+PROJECTILE_TYPES = {"normal": PROJ_NORMAL, "sine": PROJ_SINE, "homing": PROJ_HOMING}
+
+# 运动模型参数
+SINE_AMPLITUDE = 3  # 正弦弹每帧的纵向摆动幅度
+SINE_FREQUENCY = 0.1  # 每帧的相位增量（弧度）
+SINE_TABLE_SIZE = 1024  # 正弦查找表长度（2的幂）
+HOMING_CHARGE_FRAMES = 30  # 追踪弹蓄力帧数
+HOMING_TURN_RATE = 0.06  # 追踪弹每帧最大转向角（弧度）
+HOMING_MAX_SPEED = 14  # 追踪弹最大速度
+
+class MotionModel:
+    # 投射物运动模型：按整数类型编码把存活的投射物分组，每组一次向量化计算。
+    # 正弦偏移查预先计算好的表；追踪弹朝目标转向，转向角和速度都有上限，
+    # 避免速度无限增长导致一帧跨过整个碰撞体。
+    def __init__(self):
+        phases = numpy.arange(SINE_TABLE_SIZE) * (2 * math.pi / SINE_TABLE_SIZE)
+        self.sine_table = (numpy.sin(phases) * SINE_AMPLITUDE).astype(numpy.float32)
+        self.sine_scale = SINE_FREQUENCY * SINE_TABLE_SIZE / (2 * math.pi)
+        self.handlers = {
+            PROJ_SINE: self.sine,
+            PROJ_HOMING: self.homing,
+        }
+
+    def apply(self, pool, target):
+        # 在基本的匀速运动之后，对特殊类型的投射物做额外处理
+        kind = pool.kind[:pool.count]
+        for code, handler in self.handlers.items():
+            indices = numpy.flatnonzero(kind == code)
+            if len(indices):
+                handler(pool, indices, target)
+
+    def sine(self, pool, indices, target):
+        phase = (pool.lifetime[indices] * self.sine_scale).astype(numpy.int32)
+        pool.y[indices] += self.sine_table[phase & (SINE_TABLE_SIZE - 1)]
+
+    def homing(self, pool, indices, target):
+        speed_x = pool.speed_x[indices]
+        speed_y = pool.speed_y[indices]
+        charging = pool.lifetime[indices] < HOMING_CHARGE_FRAMES
+        # 蓄力效果：先减速，之后加速到上限
+        speed = numpy.hypot(speed_x, speed_y) * numpy.where(charging, 0.95, 1.1)
+        speed = numpy.minimum(speed, HOMING_MAX_SPEED)
+        heading = numpy.arctan2(speed_y, speed_x)
+        if target is not None:
+            # 蓄力结束后转向目标，每帧转角不超过HOMING_TURN_RATE
+            size = pool.size[indices]
+            center_x = pool.x[indices] + size
+            center_y = pool.y[indices] + size * 0.5
+            desired = numpy.arctan2(target[1] - center_y, target[0] - center_x)
+            turn = (desired - heading + math.pi) % (2 * math.pi) - math.pi
+            turn = numpy.clip(turn, -HOMING_TURN_RATE, HOMING_TURN_RATE)
+            heading = numpy.where(charging, heading, heading + turn)
+        pool.speed_x[indices] = speed * numpy.cos(heading)
+        pool.speed_y[indices] = speed * numpy.sin(heading)
+
+class ProjectilePool:
+    # 结构数组(SoA)形式的投射物池：所有属性存放在预分配的numpy数组中，
+    # 每帧整体向量化更新，剔除后将存活者压缩到数组前部
+    FIELDS = ('x', 'y', 'prev_x', 'prev_y', 'speed_x', 'speed_y', 'lifetime', 'size', 'kind')
+
+    def __init__(self, capacity=256, max_lifetime=180):
+        self.count = 0
+        self.capacity = 0
+        self.max_lifetime = max_lifetime  # 3秒 (60帧/秒)
+        self.spawned = 0  # 发射总数
+        self.misses = 0   # 因容量不足而扩容时写入的投射物数
+        self.motion = MotionModel()
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        old_count = self.count
+        arrays = {
+            'x': numpy.zeros(capacity, numpy.float32),
+            'y': numpy.zeros(capacity, numpy.float32),
+            'prev_x': numpy.zeros(capacity, numpy.float32),
+            'prev_y': numpy.zeros(capacity, numpy.float32),
+            'speed_x': numpy.zeros(capacity, numpy.float32),
+            'speed_y': numpy.zeros(capacity, numpy.float32),
+            'lifetime': numpy.zeros(capacity, numpy.float32),
+            'size': numpy.zeros(capacity, numpy.int32),
+            'kind': numpy.zeros(capacity, numpy.int8),
+        }
+        # 扩容时保留已有数据
+        for name, array in arrays.items():
+            if old_count:
+                array[:old_count] = getattr(self, name)[:old_count]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def hit_rate(self):
+        # 直接落在已分配槽位里的比例
+        if not self.spawned:
+            return 1.0
+        return 1.0 - self.misses / self.spawned
+
+    def spawn_batch(self, x, y, speed_x, speed_y, size, kind, lifetime=0):
+        # 一次写入一批投射物，x/y/速度/存活时间可以是数组或标量
+        n = len(speed_x)
+        self.spawned += n
+        if self.count + n > self.capacity:
+            self.misses += n
+            while self.count + n > self.capacity:
+                self._allocate(self.capacity * 2)
+        batch = slice(self.count, self.count + n)
+        self.x[batch] = self.prev_x[batch] = x
+        self.y[batch] = self.prev_y[batch] = y
+        self.speed_x[batch] = speed_x
+        self.speed_y[batch] = speed_y
+        self.lifetime[batch] = lifetime
+        self.size[batch] = size
+        self.kind[batch] = kind
+        self.count += n
+
+    def clear(self):
+        self.count = 0
+
+    def update(self, camera_x, target=None):
+        # target为追踪弹的目标点（世界坐标），没有目标时追踪弹只做加速
+        n = self.count
+        if n == 0:
+            return
+        x = self.x[:n]
+        y = self.y[:n]
+        lifetime = self.lifetime[:n]
+
+        # 记录上一步的位置，用于渲染插值
+        self.prev_x[:n] = x
+        self.prev_y[:n] = y
+        x += self.speed_x[:n]
+        y += self.speed_y[:n]
+        self.motion.apply(self, target)
+        lifetime += 1
+
+        # 超出屏幕或者存活时间过长的投射物一次性剔除
+        screen_x = x - camera_x
+        alive = ((screen_x >= -100) & (screen_x <= WINDOW_WIDTH + 100) &
+                 (y >= -100) & (y <= WINDOW_HEIGHT + 100) &
+                 (lifetime < self.max_lifetime))
+        self.compact(alive)
+
+    def compact(self, keep):
+        # 把存活的投射物搬到数组前部，不做逐个list.remove
+        if keep.all():
+            return
+        survivors = numpy.flatnonzero(keep)
+        n = len(survivors)
+        for name in self.FIELDS:
+            array = getattr(self, name)
+            array[:n] = array[survivors]
+        self.count = n
+
+    def remove(self, indices):
+        keep = numpy.ones(self.count, dtype=bool)
+        keep[indices] = False
+        self.compact(keep)
+
+    def bounds(self):
+        # 存活投射物的包围盒 (left, top, width, height)，世界坐标
+        n = self.count
+        size = self.size[:n]
+        return (self.x[:n].astype(numpy.int32), self.y[:n].astype(numpy.int32),
+                size * 2, size)
+
+    def previous_positions(self):
+        # 上一步的左上角位置，用于连续碰撞检测
+        n = self.count
+        return self.prev_x[:n].astype(numpy.int32), self.prev_y[:n].astype(numpy.int32)
+
+    def draw(self, screen, camera_x, alpha=1.0, view=FULL_VIEW):
+        # alpha为两次模拟步之间的插值系数；所有投射物用一次blits绘制，返回绘制过的区域
+        n = self.count
+        if n == 0:
+            return []
+        prev_x = self.prev_x[:n]
+        prev_y = self.prev_y[:n]
+        scale = view.scale
+        screen_x = ((prev_x + (self.x[:n] - prev_x) * alpha - camera_x) / scale).astype(numpy.int32).tolist()
+        screen_y = ((prev_y + (self.y[:n] - prev_y) * alpha) / scale).astype(numpy.int32).tolist()
+        sizes = self.size[:n] if scale == 1 else numpy.maximum(self.size[:n] // scale, 2).astype(numpy.int32)
+        sprite = projectile_sprites.get
+        batch = []
+        for kind, size, x, y in zip(self.kind[:n].tolist(), sizes.tolist(), screen_x, screen_y):
+            image, offset_x, offset_y = sprite(kind, size)
+            batch.append((image, (x + offset_x, y + offset_y)))
+        return screen.blits(batch)
+
+class ProjectileSprites:
+    # 每种 (类型, 尺寸) 的投射物只预渲染一次到带透明通道的Surface上，
+    # 之后绘制只需blit；正弦弹的光晕按半透明正确混合
+    def __init__(self):
+        self.sprites = {}
+
+    def get(self, kind, size):
+        sprite = self.sprites.get((kind, size))
+        if sprite is None:
+            sprite = self.render(kind, size)
+            self.sprites[(kind, size)] = sprite
+        return sprite
+
+    def render(self, kind, size):
+        # 返回 (Surface, 相对投射物左上角的x偏移, y偏移)
+        rect = pygame.Rect(0, 0, size * 2, size)
+        if kind == PROJ_SINE:
+            glow = 4
+            image = pygame.Surface((rect.width + glow * 2, rect.height + glow * 2), pygame.SRCALPHA)
+            rect.move_ip(glow, glow)
+            pygame.draw.ellipse(image, (100, 100, 255, 128), image.get_rect())
+            pygame.draw.ellipse(image, (50, 50, 255), rect)
+            pygame.draw.ellipse(image, (150, 150, 255), rect, 2)
+            return image, -glow, -glow
+        if kind == PROJ_HOMING:
+            # 菱形的端点和描边会超出矩形右侧和下方
+            image = pygame.Surface((rect.width + 2, rect.height + 2), pygame.SRCALPHA)
             points = [
-                (draw_rect.centerx, draw_rect.top),
-                (draw_rect.right, draw_rect.centery),
-                (draw_rect.centerx, draw_rect.bottom),
-                (draw_rect.left, draw_rect.centery)
+                (rect.centerx, rect.top),
+                (rect.right, rect.centery),
+                (rect.centerx, rect.bottom),
+                (rect.left, rect.centery)
             ]
-            pygame.draw.polygon(screen, (255, 255, 0), points)
-            pygame.draw.polygon(screen, (255, 255, 150), points, 2)
-            
-    def is_expired(self):
-        return self.lifetime >= self.max_lifetime
+            pygame.draw.polygon(image, (255, 255, 0), points)
+            pygame.draw.polygon(image, (255, 255, 150), points, 2)
+            return image, 0, 0
+        image = pygame.Surface(rect.size, pygame.SRCALPHA)
+        pygame.draw.ellipse(image, (255, 50, 50), rect)
+        pygame.draw.ellipse(image, (255, 200, 200), rect, 2)
+        return image, 0, 0
+
+# 全局的投射物精灵缓存（首次绘制时生成）
+projectile_sprites = ProjectileSprites()
+
+# 碰撞粗检测网格的单元宽度（像素）
+COLLISION_CELL_SIZE = 128
+
+class CollisionSystem:
+    # 世界坐标下的碰撞检测：沿x轴的均匀网格做粗检测，再用numpy AABB批量精检测，
+    # 不再为每个对象复制屏幕坐标的Rect。
+    # swept为True时做连续碰撞检测：检查物体在这一步中扫过的整段路径，
+    # 高速子弹和掉帧追赶时也不会穿过目标。
+    def __init__(self, cell_size=COLLISION_CELL_SIZE, swept=True):
+        self.cell_size = cell_size
+        self.swept = swept
+
+    def _occupied_cells(self, targets):
+        cells = set()
+        for rect in targets:
+            cells.update(range(rect.left // self.cell_size,
+                               (rect.right - 1) // self.cell_size + 1))
+        return numpy.array(sorted(cells), dtype=numpy.int64)
+
+    def box_hits(self, left, top, width, height, targets):
+        # 返回命中对 (mover索引数组, target索引数组)
+        empty = numpy.empty(0, numpy.intp)
+        if len(left) == 0 or not targets:
+            return empty, empty
+        right = left + width
+        bottom = top + height
+
+        # 粗检测：只保留所在网格列与目标占据的网格列重叠的对象
+        occupied = self._occupied_cells(targets)
+        first_cell = left // self.cell_size
+        last_cell = (right - 1) // self.cell_size
+        pos = numpy.searchsorted(occupied, first_cell)
+        near = pos < len(occupied)
+        near[near] = occupied[pos[near]] <= last_cell[near]
+        candidates = numpy.flatnonzero(near)
+        if len(candidates) == 0:
+            return empty, empty
+
+        # 精检测：候选对象与每个目标做向量化AABB测试
+        c_left = left[candidates]
+        c_top = top[candidates]
+        c_right = right[candidates]
+        c_bottom = bottom[candidates]
+        movers = []
+        hit_targets = []
+        for target_index, rect in enumerate(targets):
+            hit = ((c_left < rect.right) & (c_right > rect.left) &
+                   (c_top < rect.bottom) & (c_bottom > rect.top))
+            if hit.any():
+                hit_movers = candidates[hit]
+                movers.append(hit_movers)
+                hit_targets.append(numpy.full(len(hit_movers), target_index, numpy.intp))
+        if not movers:
+            return empty, empty
+        return numpy.concatenate(movers), numpy.concatenate(hit_targets)
+
+    def swept_box_hits(self, prev_left, prev_top, left, top, width, height, targets, target_moves=None):
+        # 连续碰撞检测：把目标按物体尺寸扩展（闵可夫斯基和），
+        # 再检测物体左上角在这一步的运动线段是否穿过扩展后的目标。
+        # target_moves为目标本步的位移，按相对运动计算
+        empty = numpy.empty(0, numpy.intp)
+        if len(left) == 0 or not targets:
+            return empty, empty
+        if target_moves is None:
+            target_moves = [(0, 0)] * len(targets)
+
+        # 粗检测：用扫过区域的包围盒
+        # 换算到目标当前位置的相对坐标系：起点加上目标的位移，形状为 (目标数, 物体数)
+        moves = numpy.array(target_moves, dtype=numpy.int64)
+        start_x = prev_left[numpy.newaxis, :] + moves[:, 0:1]
+        start_y = prev_top[numpy.newaxis, :] + moves[:, 1:2]
+        sweep_left = numpy.minimum(start_x.min(axis=0), left)
+        sweep_top = numpy.minimum(start_y.min(axis=0), top)
+        sweep_right = numpy.maximum(start_x.max(axis=0), left) + width
+        sweep_bottom = numpy.maximum(start_y.max(axis=0), top) + height
+        movers, hit_targets = self.box_hits(sweep_left, sweep_top, sweep_right - sweep_left,
+                                            sweep_bottom - sweep_top, targets)
+        if len(movers) == 0:
+            return movers, hit_targets
+
+        # 精检测：线段与扩展后的AABB做slab测试
+        x0 = start_x[hit_targets, movers].astype(numpy.float64)
+        y0 = start_y[hit_targets, movers].astype(numpy.float64)
+        dx = left[movers] - x0
+        dy = top[movers] - y0
+        rects = numpy.array([(rect.left, rect.top, rect.right, rect.bottom) for rect in targets])[hit_targets]
+        min_x = rects[:, 0] - width[movers]
+        min_y = rects[:, 1] - height[movers]
+        enter_x, exit_x = self.slab(x0, dx, min_x, rects[:, 2])
+        enter_y, exit_y = self.slab(y0, dy, min_y, rects[:, 3])
+        enter = numpy.maximum(numpy.maximum(enter_x, enter_y), 0.0)
+        leave = numpy.minimum(numpy.minimum(exit_x, exit_y), 1.0)
+        hit = enter < leave
+        return movers[hit], hit_targets[hit]
+
+    @staticmethod
+    def slab(start, delta, low, high):
+        # 沿一个轴计算线段 start + t*delta 位于开区间 (low, high) 内的t范围
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            t1 = (low - start) / delta
+            t2 = (high - start) / delta
+        moving = delta != 0
+        inside = (start > low) & (start < high)
+        enter = numpy.where(moving, numpy.minimum(t1, t2), numpy.where(inside, -numpy.inf, numpy.inf))
+        leave = numpy.where(moving, numpy.maximum(t1, t2), numpy.where(inside, numpy.inf, -numpy.inf))
+        return enter, leave
+
+    def projectile_hits(self, projectiles, targets, target_moves=None):
+        if self.swept:
+            return self.swept_box_hits(*projectiles.previous_positions(), *projectiles.bounds(),
+                                       targets, target_moves)
+        return self.box_hits(*projectiles.bounds(), targets)
+
+    def bullet_hits(self, bullets, targets):
+        # 子弹数量少且各自带Rect，直接用collidelistall批量返回命中对；
+        # 连续检测时使用子弹本步扫过的矩形
+        pairs = []
+        live = bullets.live
+        rects = [bullet.swept for bullet in live] if self.swept else live
+        for target_index, rect in enumerate(targets):
+            for i in rect.collidelistall(rects):
+                pairs.append((live[i], target_index))
+        return pairs
 
 class GameAssets:
-    def __init__(self):
+    def __init__(self, lazy=False, low_res=None):
+        # 开始界面需要的资源立即加载，其余资源在load_steps中分步加载；
+        # low_res为低分辨率画布尺寸时，同时加载该分辨率下的第二套动画帧
         # 加载并等比例缩放开始界面
         original_start_ui = pygame.image.load('assets/UI start.png').convert_alpha()
         scale = WINDOW_HEIGHT / original_start_ui.get_height()
@@ -200,46 +971,187 @@ class GameAssets:
         
         # 加载背景
         self.bg = pygame.image.load('assets/BG_2.png').convert()  # 更新背景文件
-        
-        # Trump动画 - 缩小20%
-        self.trump_idle = load_sprite_sheet('assets/Trump idle.png', 4, 1, 0.5)  # 从0.7改为0.5
-        self.trump_run = load_sprite_sheet('assets/Trump run.png', 4, 1, 0.5)  # 从0.7改为0.5
-        
-        # BOSS动画
-        self.boss_idle = load_sprite_sheet('assets/BOSS idle.png', 4, 1, 1.5)
-        self.boss_walk = load_sprite_sheet('assets/boss walk.png', 4, 1, 1.5)
+        self.rect_masks = {}
+        self.low_res = low_res
+        self.low_res_frames = {}
+        self.ready = False
+        if not lazy:
+            self.load()
+
+    def load(self):
+        for _ in self.load_steps():
+            pass
+
+    async def load_async(self):
+        # 每加载一步就让出一次事件循环，网页端可以先显示开始界面
+        for _ in self.load_steps():
+            await asyncio.sleep(0)
+
+    def load_in_background(self):
+        # 桌面端在后台线程中加载其余资源
+        thread = threading.Thread(target=self.load, daemon=True)
+        thread.start()
+        return thread
+
+    def load_steps(self):
+        # 动画帧（已缩放、翻转、着色）
+        frames = yield from load_sprite_frames()
+        self.frames = frames
+        yield
+
+        self.trump_idle = frames['trump_idle']
+        self.trump_run = frames['trump_run']
+        self.trump_idle_left = frames['trump_idle_left']
+        self.trump_run_left = frames['trump_run_left']
+        self.boss_idle = frames['boss_idle']
+        self.boss_walk = frames['boss_walk']
+        self.boss_idle_hit = frames['boss_idle_hit']
+        self.boss_walk_hit = frames['boss_walk_hit']
+        self.minion_walk = frames['minion_walk']
+        self.minion_walk_hit = frames['minion_walk_hit']
         
         # UI元素
         self.game_ui = pygame.image.load('assets/Game UI Design.png').convert_alpha()
         self.game_ui = pygame.transform.scale(self.game_ui, 
                                             (self.game_ui.get_width()//4, 
                                              self.game_ui.get_height()//4))
-        
-        # 水平翻转BOSS动画
-        for i in range(len(self.boss_idle)):
-            self.boss_idle[i] = pygame.transform.flip(self.boss_idle[i], True, False)
-        for i in range(len(self.boss_walk)):
-            self.boss_walk[i] = pygame.transform.flip(self.boss_walk[i], True, False)
+        yield
+
+        # 预先计算BOSS每一帧的遮罩，游戏过程中不再生成
+        self.boss_idle_masks = [pygame.mask.from_surface(frame) for frame in self.boss_idle]
+        self.boss_walk_masks = [pygame.mask.from_surface(frame) for frame in self.boss_walk]
+        yield
+
+        if self.low_res is not None:
+            # 低分辨率画布用的动画帧：精灵表按画布比例缩放，帧直接从源PNG缩放得到；
+            # 模拟用的每一帧都对应到其中同名动画的同一帧
+            factor = WINDOW_WIDTH / self.low_res[0]
+            sheets = [(name, filename, cols, rows, scale / factor, flip)
+                      for name, filename, cols, rows, scale, flip in SPRITE_SHEETS]
+            scaled = yield from load_sprite_frames(sheets)
+            for name, sequence in frames.items():
+                self.low_res_frames.update(zip(sequence, scaled[name]))
+            yield
+
+        # 音效（首次启动时合成，之后读取缓存）
+        self.sounds = load_sounds()
+        self.ready = True
+
+    def rect_mask(self, size):
+        # 按尺寸缓存的实心矩形遮罩（用于子弹与BOSS的像素级判定）
+        mask = self.rect_masks.get(size)
+        if mask is None:
+            mask = pygame.mask.Mask(size, fill=True)
+            self.rect_masks[size] = mask
+        return mask
 
 class Bullet:
+    # 子弹数量多且生命周期短，用__slots__省掉每个实例的__dict__
+    __slots__ = ('rect', 'swept', 'prev_x', 'direction', 'speed')
+
     def __init__(self, x, y, direction, speed):
         self.rect = pygame.Rect(x, y, 8, 4)
+        self.swept = pygame.Rect(self.rect)  # 本步扫过的区域，用于连续碰撞检测
+        self.prev_x = x  # 上一步的位置，用于渲染插值
         self.direction = direction  # 1 for right, -1 for left
         self.speed = speed
         
+    def reset(self, x, y, direction, speed):
+        # 复用已有的Rect，避免重新分配
+        self.rect.x = x
+        self.rect.y = y
+        self.swept.update(self.rect)
+        self.prev_x = x
+        self.direction = direction
+        self.speed = speed
+
     def update(self):
+        self.prev_x = self.rect.x
         self.rect.x += self.speed * self.direction
+        # 子弹只做水平运动，扫过的区域就是起点和终点矩形的并集
+        self.swept.x = min(self.prev_x, self.rect.x)
+        self.swept.y = self.rect.y
+        self.swept.width = abs(self.rect.x - self.prev_x) + self.rect.width
         
     def is_visible(self, camera_x):
         # 检查子弹是否在相机视野范围内（稍微扩大一些范围）
         bullet_screen_x = self.rect.x - camera_x
         return -100 < bullet_screen_x < WINDOW_WIDTH + 100
 
+class BulletPool:
+    # 固定容量的玩家子弹池：离开相机视野的子弹回收到空闲列表重复使用
+    def __init__(self, capacity=32):
+        self.capacity = capacity
+        self.free = [Bullet(0, 0, 1, 0) for _ in range(capacity)]
+        self.live = []
+        self.peak_count = 0
+        self.hits = 0    # 从空闲列表取到子弹的次数
+        self.misses = 0  # 池已空、只能挪用仍在飞的子弹的次数
+
+    def __len__(self):
+        return len(self.live)
+
+    def __iter__(self):
+        return iter(self.live)
+
+    @property
+    def live_count(self):
+        return len(self.live)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 1.0
+
+    def spawn(self, x, y, direction, speed):
+        if self.free:
+            bullet = self.free.pop()
+            self.hits += 1
+        else:
+            # 池已满时复用最早发射的子弹
+            bullet = self.live.pop(0)
+            self.misses += 1
+        bullet.reset(x, y, direction, speed)
+        self.live.append(bullet)
+        if len(self.live) > self.peak_count:
+            self.peak_count = len(self.live)
+        return bullet
+
+    def release(self, bullet):
+        self.live.remove(bullet)
+        self.free.append(bullet)
+
+    def clear(self):
+        self.free.extend(self.live)
+        self.live.clear()
+
+    def draw(self, screen, camera_x, alpha=1.0, view=FULL_VIEW):
+        # 按插值后的位置绘制所有子弹，返回绘制过的区域
+        drawn = []
+        for bullet in self.live:
+            rect = bullet.rect.copy()
+            rect.x = round(bullet.prev_x + (bullet.rect.x - bullet.prev_x) * alpha - camera_x)
+            drawn.append(pygame.draw.rect(screen, WHITE, view.rect(rect)))
+        return drawn
+
+    def update(self, camera_x):
+        visible = []
+        for bullet in self.live:
+            bullet.update()
+            if bullet.is_visible(camera_x):
+                visible.append(bullet)
+            else:
+                self.free.append(bullet)
+        self.live = visible
+
 class Player:
-    def __init__(self, assets):
+    def __init__(self, assets, events=None):
         self.assets = assets
+        self.events = events if events is not None else []  # 声音事件
         self.idle_frames = assets.trump_idle
         self.run_frames = assets.trump_run
+        self.idle_frames_left = assets.trump_idle_left
+        self.run_frames_left = assets.trump_run_left
         self.current_frame = 0
         self.animation_timer = 0
         self.animation_delay = 80
@@ -249,8 +1161,11 @@ class Player:
         self.rect = self.image.get_rect()
         self.rect.x = 100
         self.rect.bottom = GROUND_HEIGHT
+        self.prev_x = self.rect.x  # 上一步的位置，用于渲染插值
+        self.prev_y = self.rect.y
         self.health = 100
-        self.bullets = []  # 现在存储Bullet对象而不是Rect
+        self.max_health = 100
+        self.bullets = BulletPool()  # 回收复用的Bullet对象池
         self.shoot_timer = 0
         self.shoot_delay = 300  # 提高射击频率
         self.speed = 12  # 提高移动速度
@@ -261,7 +1176,7 @@ class Player:
         self.is_jumping = False
         self.air_control = 0.8  # 空中移动控制
 
-    def update(self, current_time):
+    def update(self, current_time, camera_x):
         # 重力
         self.velocity_y += GRAVITY
         self.rect.y += self.velocity_y
@@ -276,45 +1191,138 @@ class Player:
         if current_time - self.animation_timer > self.animation_delay:
             self.animation_timer = current_time
             self.current_frame = (self.current_frame + 1) % len(self.idle_frames)
+            # 根据朝向选择预先翻转好的帧
             if self.is_running:
-                frame = self.run_frames[self.current_frame]
-            else:
-                frame = self.idle_frames[self.current_frame]
-            # 根据朝向翻转图像
-            if self.facing_left:
-                self.image = pygame.transform.flip(frame, True, False)
+                frames = self.run_frames_left if self.facing_left else self.run_frames
             else:
-                self.image = frame
+                frames = self.idle_frames_left if self.facing_left else self.idle_frames
+            self.image = frames[self.current_frame]
 
         # 自动射击
         if current_time - self.shoot_timer > self.shoot_delay:
             self.shoot_timer = current_time
             self.shoot()
 
-        # 更新子弹
-        for bullet in self.bullets:
-            bullet.update()
+        # 更新子弹，离开视野的回收到池中
+        self.bullets.update(camera_x)
 
     def shoot(self):
         direction = -1 if self.facing_left else 1
         if self.facing_left:
-            bullet = Bullet(self.rect.left, self.rect.centery, direction, self.bullet_speed)
+            self.bullets.spawn(self.rect.left, self.rect.centery, direction, self.bullet_speed)
         else:
-            bullet = Bullet(self.rect.right, self.rect.centery, direction, self.bullet_speed)
-        self.bullets.append(bullet)
-        shoot_sound.play()
+            self.bullets.spawn(self.rect.right, self.rect.centery, direction, self.bullet_speed)
+        self.events.append('shoot')
+
+    def draw(self, screen, camera_x, alpha=1.0, view=FULL_VIEW):
+        # 按上一步和当前步之间插值后的位置绘制
+        rect = self.rect.copy()
+        rect.x = round(self.prev_x + (self.rect.x - self.prev_x) * alpha - camera_x)
+        rect.y = round(self.prev_y + (self.rect.y - self.prev_y) * alpha)
+        return [screen.blit(view.image(self.image), view.rect(rect))]
+
+    def draw_projectiles(self, screen, camera_x, alpha=1.0, view=FULL_VIEW):
+        return self.bullets.draw(screen, camera_x, alpha, view)
 
     def jump(self):
         if not self.is_jumping:
             self.velocity_y = JUMP_SPEED
             self.is_jumping = True
-            jump_sound.play()
+            self.events.append('jump')
+
+# 弹幕模式定义（纯数据）：
+#   count        子弹数量
+#   angle        中心方向（度，0为向右，y轴向下）
+#   spread       角度范围（度）；360表示均匀分布在整圈上
+#   speed        相对BOSS子弹速度的倍数
+#   size         相对BOSS子弹尺寸的倍数
+#   type         运动类型 normal / sine / homing
+#   spin         每毫秒旋转的角度，用于螺旋
+#   spacing_x    相邻子弹的水平间距
+#   lifetime_step 相邻子弹初始存活时间的差（用于错开正弦相位）
+#   volleys/interval 连续发射的轮数和每轮间隔（毫秒）
+#   delay        这个模式结束后到下一个模式的间隔（毫秒），默认使用BOSS的attack_delay
+BULLET_PATTERNS = [
+    # 五连快速直线
+    {'name': 'line', 'count': 7, 'angle': 180, 'spacing_x': -18},
+    # 七发扇形
+    {'name': 'fan', 'count': 7, 'angle': 180, 'spread': 120},
+    # 双相位正弦
+    {'name': 'sine', 'count': 3, 'angle': 180, 'type': 'sine', 'lifetime_step': 15 * math.pi},
+    # 四颗追踪
+    {'name': 'homing', 'count': 4, 'angle': 180, 'type': 'homing', 'size': 1.2},
+    # 24 向环形
+    {'name': 'ring', 'count': 24, 'spread': 360, 'speed': 0.8, 'size': 0.9},
+    # 旋转螺旋：12颗，起始角度随时间旋转
+    {'name': 'spiral', 'count': 12, 'spread': 360, 'size': 0.8, 'spin': 0.1},
+]
+
+class BulletPattern:
+    # 把一条弹幕定义编译成预先计算好的速度表，发射时整批写入投射物池
+    def __init__(self, spec, base_speed, base_size):
+        self.name = spec['name']
+        self.count = spec['count']
+        self.kind = PROJECTILE_TYPES[spec.get('type', 'normal')]
+        self.size = int(base_size * spec.get('size', 1.0))
+        self.spin = spec.get('spin', 0)
+        self.volleys = spec.get('volleys', 1)
+        self.interval = spec.get('interval', 0)
+        self.delay = spec.get('delay')
+
+        spread = spec.get('spread', 0)
+        if spread >= 360:
+            offsets = numpy.arange(self.count) * (360 / self.count)
+        elif self.count > 1:
+            offsets = numpy.linspace(-spread / 2, spread / 2, self.count)
+        else:
+            offsets = numpy.zeros(1)
+        angles = spec.get('angle', 0) + offsets
+        # 有旋转时为每个整数角度预先算好一行，发射时只需查表
+        if self.spin:
+            angles = angles[numpy.newaxis, :] + numpy.arange(360)[:, numpy.newaxis]
+        else:
+            angles = angles[numpy.newaxis, :]
+        radians = numpy.radians(angles)
+        speed = base_speed * spec.get('speed', 1.0)
+        self.speed_x = (speed * numpy.cos(radians)).astype(numpy.float32)
+        self.speed_y = (speed * numpy.sin(radians)).astype(numpy.float32)
+        self.offset_x = numpy.arange(self.count, dtype=numpy.float32) * spec.get('spacing_x', 0)
+        self.lifetimes = numpy.arange(self.count, dtype=numpy.float32) * spec.get('lifetime_step', 0)
+
+    def emit(self, pool, x, y, current_time):
+        row = int(current_time * self.spin) % 360 if self.spin else 0
+        pool.spawn_batch(x + self.offset_x, y, self.speed_x[row], self.speed_y[row],
+                         self.size, self.kind, self.lifetimes)
+
+class PatternScheduler:
+    # 按顺序循环弹幕模式；一个模式可以连续发射多轮后再切换到下一个
+    def __init__(self, patterns, order=None):
+        self.patterns = patterns
+        self.order = order if order is not None else list(range(len(patterns)))
+        self.position = -1
+        self.volleys_left = 0
+
+    def next(self):
+        # 返回 (弹幕索引, 距下一次攻击的毫秒数)；None表示使用默认间隔
+        if self.volleys_left == 0:
+            self.position = (self.position + 1) % len(self.order)
+            self.volleys_left = self.patterns[self.order[self.position]].volleys
+        index = self.order[self.position]
+        pattern = self.patterns[index]
+        self.volleys_left -= 1
+        if self.volleys_left > 0:
+            return index, pattern.interval
+        return index, pattern.delay
 
 class Boss:
-    def __init__(self, assets):
+    def __init__(self, assets, events=None):
         self.assets = assets
+        self.events = events if events is not None else []  # 声音事件
         self.idle_frames = assets.boss_idle
         self.walk_frames = assets.boss_walk
+        self.idle_masks = assets.boss_idle_masks
+        self.idle_hit_frames = assets.boss_idle_hit
+        self.walk_masks = assets.boss_walk_masks
         self.current_frame = 0
         self.animation_timer = 0
         self.animation_delay = 150
@@ -326,24 +1334,25 @@ class Boss:
         self.rect.bottom = GROUND_HEIGHT
         self.health = 400
         self.max_health = 400
-        self.projectiles = []
+        self.projectiles = ProjectilePool()
         self.attack_timer = 0
         self.attack_delay = 600  # 更快
-        self.attack_pattern = -1
-        self.pattern_timer = 0
-        self.pattern_duration = 5000
+        self.attack_wait = self.attack_delay  # 距下一次攻击的间隔
         self.has_appeared = False
         self.entrance_speed = 6
         self.projectile_size = 15
         self.projectile_speed = 8  # 更快的子弹速度
+        self.compile_patterns()
+        self.scheduler = PatternScheduler(self.patterns)
         self.hit_effect_timer = 0
         self.hit_effect_duration = 100
         self.is_hit = False
         
-        # 创建遮罩
-        self.mask = pygame.mask.from_surface(self.image)
+        # 使用预先计算的遮罩
+        self.mask = self.idle_masks[0]
 
-    def update(self, current_time, player_x, camera_x):
+    def update(self, current_time, target, camera_x):
+        # target为玩家中心点，追踪弹朝它转向
         if not self.has_appeared:
             return
 
@@ -361,375 +1370,1204 @@ class Boss:
             self.animation_timer = current_time
             self.current_frame = (self.current_frame + 1) % len(self.idle_frames)
             self.image = self.idle_frames[self.current_frame]
-            self.mask = pygame.mask.from_surface(self.image)
+            self.mask = self.idle_masks[self.current_frame]
 
         # 攻击逻辑
-        if current_time - self.attack_timer > self.attack_delay:
+        if current_time - self.attack_timer > self.attack_wait:
             self.attack_timer = current_time
-            self.attack_pattern = (self.attack_pattern + 1) % 6
-            self.shoot_projectiles()
+            self.shoot_projectiles(current_time)
 
         # 更新投射物并移除超出屏幕或已过期的
-        for projectile in self.projectiles[:]:
-            projectile.update()
-            # 如果子弹超出了屏幕或者存活时间过长，移除它
-            projectile_screen_x = projectile.rect.x - camera_x
-            if (projectile_screen_x < -100 or 
-                projectile_screen_x > WINDOW_WIDTH + 100 or
-                projectile.rect.y < -100 or 
-                projectile.rect.y > WINDOW_HEIGHT + 100 or
-                projectile.is_expired()):
-                self.projectiles.remove(projectile)
-
-    def shoot_projectiles(self):
-                # 循环切换弹幕模式
-        self.attack_pattern = (self.attack_pattern + 1) % 6
-        pattern = self.attack_pattern
-        if pattern == 0:
-            # 五连快速直线
-            for i in range(7):
-                self.projectiles.append(Projectile(
-                    self.rect.centerx - i*18,
-                    self.rect.centery,
-                    -self.projectile_speed,
-                    0,
-                    self.projectile_size,
-                    RED))
-        elif pattern == 1:
-            # 七发扇形
-            for angle in range(-60, 61, 20):
-                rad = math.radians(angle)
-                self.projectiles.append(Projectile(
-                    self.rect.centerx,
-                    self.rect.centery,
-                    -self.projectile_speed*math.cos(rad),
-                    self.projectile_speed*math.sin(rad),
-                    self.projectile_size,
-                    RED))
-        elif pattern == 2:
-            # 双相位正弦
-            for phase in [0, math.pi/2, math.pi]:
-                p = Projectile(self.rect.centerx,
-                                self.rect.centery,
-                                -self.projectile_speed,
-                                0,
-                                self.projectile_size,
-                                BLUE,
-                                "sine")
-                p.lifetime = phase*30
-                self.projectiles.append(p)
-        elif pattern == 3:
-            # 四颗追踪
-            for _ in range(4):
-                self.projectiles.append(Projectile(
-                    self.rect.centerx,
-                    self.rect.centery,
-                    -self.projectile_speed,
-                    0,
-                    int(self.projectile_size*1.2),
-                    YELLOW,
-                    "homing"))
-        elif pattern == 4:
-            # 24 向环形
-            for angle in range(0,360,15):
-                rad = math.radians(angle)
-                self.projectiles.append(Projectile(
-                    self.rect.centerx,
-                    self.rect.centery,
-                    self.projectile_speed*0.8*math.cos(rad),
-                    self.projectile_speed*0.8*math.sin(rad),
-                    int(self.projectile_size*0.9)))
-        else:
-            # 旋转螺旋：发射12颗并在后续帧继续旋转（简化为不同初始角度）
-            base_angle = (pygame.time.get_ticks()//10)%360
-            for angle in range(base_angle, base_angle+360, 30):
-                rad = math.radians(angle)
-                self.projectiles.append(Projectile(
-                    self.rect.centerx,
-                    self.rect.centery,
-                    self.projectile_speed*math.cos(rad),
-                    self.projectile_speed*math.sin(rad),
-                    int(self.projectile_size*0.8)))
+        self.projectiles.update(camera_x, target)
+
+    def compile_patterns(self):
+        # 根据当前的子弹速度和尺寸编译弹幕表（调整参数后会自动重新编译）
+        self.patterns = [BulletPattern(spec, self.projectile_speed, self.projectile_size)
+                         for spec in BULLET_PATTERNS]
+        self.patterns_key = (self.projectile_speed, self.projectile_size)
+
+    def shoot_projectiles(self, current_time):
+        # 由调度器决定发射哪个弹幕以及距下一次攻击的间隔
+        index, wait = self.scheduler.next()
+        self.attack_wait = wait if wait is not None else self.attack_delay
+        self.fire_pattern(index, current_time)
+
+    def fire_pattern(self, index, current_time):
+        if self.patterns_key != (self.projectile_speed, self.projectile_size):
+            self.compile_patterns()
+        self.patterns[index].emit(self.projectiles, self.rect.centerx, self.rect.centery, current_time)
 
     def take_damage(self, damage, current_time):
         self.health -= damage
         self.is_hit = True
         self.hit_effect_timer = current_time
 
-    def draw(self, screen, rect):
-        if self.is_hit:
-            # 创建一个暂时的表面来应用红色色调效果
-            temp_surface = pygame.Surface((self.image.get_width(), self.image.get_height()), pygame.SRCALPHA)
-            # 绘制原始图像
-            temp_surface.blit(self.image, (0, 0))
-            # 创建一个红色图层
-            red_surface = pygame.Surface((self.image.get_width(), self.image.get_height()), pygame.SRCALPHA)
-            red_surface.fill((255, 0, 0, 100))  # 半透明红色
-            # 混合红色图层
-            temp_surface.blit(red_surface, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
-            # 绘制到屏幕
-            screen.blit(temp_surface, rect)
-        else:
-            screen.blit(self.image, rect)
+    def damage(self, bullets, damage, current_time, collisions):
+        # 玩家子弹对BOSS：网格粗检测后再做像素级判定，返回命中的子弹
+        if not self.has_appeared:
+            return []
+        hits = []
+        for bullet, _ in collisions.bullet_hits(bullets, [self.rect]):
+            if self.check_bullet_collision(bullet, collisions.swept):
+                self.take_damage(damage, current_time)
+                hits.append(bullet)
+        return hits
+
+    def contact(self, rect):
+        # BOSS没有撞击伤害
+        return 0
 
-    def check_bullet_collision(self, bullet, camera_x):
-        # 简化碰撞检测，提高命中率
-        bullet_center_x = bullet.rect.centerx - self.rect.x
-        bullet_center_y = bullet.rect.centery - self.rect.y
+    def cull(self, camera_x):
+        # BOSS跟随相机，不会被剔除
+        return 0
+
+    def draw(self, screen, camera_x, alpha=1.0, view=FULL_VIEW):
+        # BOSS固定在屏幕右侧（世界坐标每步都按相机重新定位），不随插值后的相机移动
+        if not self.has_appeared:
+            return []
+        rect = self.rect.copy()
+        rect.x = self.screen_offset
+        # 受击时使用预先生成的红色色调帧
+        image = self.idle_hit_frames[self.current_frame] if self.is_hit else self.image
+        return [screen.blit(view.image(image), view.rect(rect))]
+
+    def draw_projectiles(self, screen, camera_x, alpha=1.0, view=FULL_VIEW):
+        if not self.has_appeared:
+            return []
+        return self.projectiles.draw(screen, camera_x, alpha, view)
+
+    def check_bullet_collision(self, bullet, swept=False):
+        # 先用矩形粗略判定，再用缓存的遮罩做像素级判定；
+        # swept为True时检测子弹本步扫过的整个区域，高速子弹不会穿过BOSS
+        rect = bullet.swept if swept else bullet.rect
+        if not self.rect.colliderect(rect):
+            return False
+        offset = (rect.x - self.rect.x, rect.y - self.rect.y)
+        bullet_mask = self.assets.rect_mask(rect.size)
+        return self.mask.overlap(bullet_mask, offset) is not None
+
+# 实体类型定义（纯数据），列表下标就是类型编码：
+#   frames/hit_frames  GameAssets中的动画帧（受击时换成hit_frames）
+#   frame_ms           每帧动画的时长
+#   health             初始血量
+#   speed              水平移动速度（负数向左）
+#   emit_ms            发射间隔（毫秒），0表示不发射
+#   emit_speed         发射的子弹朝玩家飞行的速度
+#   contact_damage     撞到玩家时造成的伤害（撞击后自身消失）
+ENTITY_KINDS = [
+    {'name': 'minion', 'frames': 'minion_walk', 'hit_frames': 'minion_walk_hit', 'frame_ms': 120,
+     'health': 15, 'speed': -2.5, 'emit_ms': 1800, 'emit_speed': 6, 'contact_damage': 10},
+    {'name': 'runner', 'frames': 'minion_walk', 'hit_frames': 'minion_walk_hit', 'frame_ms': 60,
+     'health': 5, 'speed': -6, 'emit_ms': 0, 'emit_speed': 0, 'contact_damage': 10},
+]
+ENTITY_TYPES = {spec['name']: code for code, spec in enumerate(ENTITY_KINDS)}
+ENTITY_HIT_MS = 100  # 受击闪红的时长
+
+class EntityStore:
+    # 实体-组件存储：每个组件是一列预分配的numpy数组，一个实体就是所有数组中的同一个下标。
+    #   变换 x, y, prev_x, prev_y     速度 speed_x, speed_y
+    #   动画 frame, frame_time        血量 health, hit_time
+    #   发射器 emit_time              碰撞盒 width, height
+    # 同一类型的数值参数按kind编码查表，系统对所有实体一次向量化处理，
+    # 死亡或离开视野的实体压缩掉，和ProjectilePool一样不做逐个删除
+    FIELDS = {
+        'x': numpy.float32, 'y': numpy.float32, 'prev_x': numpy.float32, 'prev_y': numpy.float32,
+        'speed_x': numpy.float32, 'speed_y': numpy.float32,
+        'frame': numpy.int32, 'frame_time': numpy.float32,
+        'health': numpy.int32, 'hit_time': numpy.float32,
+        'emit_time': numpy.float32,
+        'width': numpy.int32, 'height': numpy.int32,
+        'kind': numpy.int8,
+    }
+
+    def __init__(self, capacity=64):
+        self.count = 0
+        self.capacity = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        old_count = self.count
+        for name, dtype in self.FIELDS.items():
+            array = numpy.zeros(capacity, dtype)
+            if old_count:
+                array[:old_count] = getattr(self, name)[:old_count]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def __len__(self):
+        return self.count
+
+    def spawn(self, kind, x, y, width, height, speed_x, health):
+        if self.count == self.capacity:
+            self._allocate(self.capacity * 2)
+        i = self.count
+        self.x[i] = self.prev_x[i] = x
+        self.y[i] = self.prev_y[i] = y
+        self.speed_x[i] = speed_x
+        self.speed_y[i] = 0
+        self.frame[i] = 0
+        self.frame_time[i] = 0
+        self.health[i] = health
+        self.hit_time[i] = ENTITY_HIT_MS
+        self.emit_time[i] = 0
+        self.width[i] = width
+        self.height[i] = height
+        self.kind[i] = kind
+        self.count += 1
+        return i
+
+    def clear(self):
+        self.count = 0
+
+    def compact(self, keep):
+        if keep.all():
+            return
+        survivors = numpy.flatnonzero(keep)
+        n = len(survivors)
+        for name in self.FIELDS:
+            array = getattr(self, name)
+            array[:n] = array[survivors]
+        self.count = n
+
+class EntitySystems:
+    # 作用在EntityStore上的各个系统：移动、动画、发射、受伤、撞击、剔除、渲染。
+    # 每个系统对所有实体一次处理，按类型不同的参数从查找表中取，
+    # 新增敌人类型只需要在ENTITY_KINDS里加一行数据
+    def __init__(self, assets, events=None, kinds=ENTITY_KINDS):
+        self.events = events if events is not None else []
+        self.store = EntityStore()
+        self.projectiles = ProjectilePool()  # 实体发射的子弹
+        self.kinds = kinds
+        self.frames = [getattr(assets, spec['frames']) for spec in kinds]
+        self.hit_frames = [getattr(assets, spec['hit_frames']) for spec in kinds]
+        self.frame_counts = numpy.array([len(frames) for frames in self.frames], numpy.int32)
+        self.frame_ms = numpy.array([spec['frame_ms'] for spec in kinds], numpy.float32)
+        self.emit_ms = numpy.array([spec['emit_ms'] for spec in kinds], numpy.float32)
+        self.emit_speed = numpy.array([spec['emit_speed'] for spec in kinds], numpy.float32)
+        self.contact_damage = numpy.array([spec['contact_damage'] for spec in kinds], numpy.int32)
+
+    def __len__(self):
+        return len(self.store)
+
+    def spawn(self, name, x):
+        # 在地面上生成一个实体，碰撞盒取动画帧的大小
+        kind = ENTITY_TYPES[name]
+        spec = self.kinds[kind]
+        width, height = self.frames[kind][0].get_size()
+        return self.store.spawn(kind, x, GROUND_HEIGHT - height, width, height,
+                                spec['speed'], spec['health'])
+
+    def update(self, current_time, target, camera_x):
+        # target为玩家中心点，发射器朝它瞄准；参数顺序和Boss.update相同
+        store = self.store
+        n = store.count
+        if n:
+            kind = store.kind[:n]
+            self.motion(store, n)
+            self.animation(store, n, kind)
+            self.emitters(store, n, kind, camera_x, target)
+            store.hit_time[:n] += TIME_STEP_MS
+        self.projectiles.update(camera_x, target)
+
+    def motion(self, store, n):
+        store.prev_x[:n] = store.x[:n]
+        store.prev_y[:n] = store.y[:n]
+        store.x[:n] += store.speed_x[:n]
+        store.y[:n] += store.speed_y[:n]
+
+    def animation(self, store, n, kind):
+        frame_time = store.frame_time[:n]
+        frame_time += TIME_STEP_MS
+        frame_ms = self.frame_ms[kind]
+        advance = frame_time >= frame_ms
+        frame_time -= frame_ms * advance
+        store.frame[:n] = (store.frame[:n] + advance) % self.frame_counts[kind]
+
+    def emitters(self, store, n, kind, camera_x, target):
+        # 只有屏幕内的实体才开火
+        emit_time = store.emit_time[:n]
+        emit_time += TIME_STEP_MS
+        emit_ms = self.emit_ms[kind]
+        screen_x = store.x[:n] - camera_x
+        ready = ((emit_ms > 0) & (emit_time >= emit_ms) &
+                 (screen_x > 0) & (screen_x < WINDOW_WIDTH))
+        shooters = numpy.flatnonzero(ready)
+        if not len(shooters):
+            return
+        emit_time[shooters] = 0
+        x = store.x[shooters] + store.width[shooters] * 0.5
+        y = store.y[shooters] + store.height[shooters] * 0.4
+        angle = numpy.arctan2(target[1] - y, target[0] - x)
+        speed = self.emit_speed[kind[shooters]]
+        self.projectiles.spawn_batch(x, y, speed * numpy.cos(angle), speed * numpy.sin(angle),
+                                     10, PROJ_NORMAL)
+        self.events.append('shoot')
+
+    def boxes(self):
+        store = self.store
+        n = store.count
+        left = store.x[:n]
+        top = store.y[:n]
+        return left, top, left + store.width[:n], top + store.height[:n]
+
+    def damage(self, bullets, damage, current_time, collisions):
+        # 玩家子弹对实体：每颗子弹只打中一个实体，返回命中的子弹
+        hits = []
+        if not self.store.count:
+            return hits
+        left, top, right, bottom = self.boxes()
+        health = self.store.health
+        swept = collisions.swept
+        for bullet in bullets:
+            rect = bullet.swept if swept else bullet.rect
+            overlap = ((left < rect.right) & (right > rect.left) &
+                       (top < rect.bottom) & (bottom > rect.top) & (health[:len(left)] > 0))
+            if overlap.any():
+                i = int(overlap.argmax())
+                health[i] -= damage
+                self.store.hit_time[i] = 0
+                hits.append(bullet)
+        return hits
+
+    def contact(self, rect):
+        # 撞到玩家的实体造成伤害后消失，返回总伤害
+        store = self.store
+        if not store.count:
+            return 0
+        left, top, right, bottom = self.boxes()
+        touching = ((left < rect.right) & (right > rect.left) &
+                    (top < rect.bottom) & (bottom > rect.top) & (store.health[:store.count] > 0))
+        if not touching.any():
+            return 0
+        store.health[:store.count][touching] = 0
+        return int(self.contact_damage[store.kind[:store.count][touching]].sum())
+
+    def cull(self, camera_x):
+        # 移除死亡或远离相机的实体，返回被击倒的数量
+        store = self.store
+        n = store.count
+        if not n:
+            return 0
+        alive = store.health[:n] > 0
+        screen_x = store.x[:n] - camera_x
+        store.compact(alive & (screen_x + store.width[:n] > -200) & (screen_x < WINDOW_WIDTH + CHUNK_WIDTH))
+        return int(n - alive.sum())
+
+    def draw(self, screen, camera_x, alpha=1.0, view=FULL_VIEW):
+        # 所有实体用一次blits绘制，返回绘制过的区域
+        store = self.store
+        n = store.count
+        drawn = []
+        if n:
+            prev_x = store.prev_x[:n]
+            screen_x = ((prev_x + (store.x[:n] - prev_x) * alpha - camera_x) / view.scale).astype(numpy.int32).tolist()
+            screen_y = (store.y[:n] / view.scale).astype(numpy.int32).tolist()
+            hit = (store.hit_time[:n] < ENTITY_HIT_MS).tolist()
+            batch = []
+            for kind, frame, flash, x, y in zip(store.kind[:n].tolist(), store.frame[:n].tolist(),
+                                                hit, screen_x, screen_y):
+                frames = self.hit_frames[kind] if flash else self.frames[kind]
+                batch.append((view.image(frames[frame]), (x, y)))
+            drawn = screen.blits(batch)
+        return drawn
+
+    def draw_projectiles(self, screen, camera_x, alpha=1.0, view=FULL_VIEW):
+        return self.projectiles.draw(screen, camera_x, alpha, view)
+
+# 每一步的输入位掩码
+INPUT_LEFT = 1
+INPUT_RIGHT = 2
+INPUT_JUMP = 4
+
+def read_input():
+    # 把当前键盘状态转换为输入位掩码
+    keys = pygame.key.get_pressed()
+    inputs = 0
+    if keys[K_LEFT]:
+        inputs |= INPUT_LEFT
+    if keys[K_RIGHT]:
+        inputs |= INPUT_RIGHT
+    if keys[K_SPACE]:
+        inputs |= INPUT_JUMP
+    return inputs
+
+# 录像文件头：魔数、版本、随机种子、模拟帧率、总步数、结果
+REPLAY_MAGIC = b'TVBR'
+REPLAY_VERSION = 3  # 2：世界分块的内容由种子决定；3：加入小兵，旧录像无法重现
+REPLAY_HEADER = struct.Struct('<4sBIBIB')
+REPLAY_RESULTS = {None: 0, 'WIN': 1, 'LOSE': 2}
+
+class InputRecorder:
+    # 逐步记录输入位掩码。模拟是确定性的，只要种子和每一步的输入就能重现整场战斗，
+    # 步号即时间；连续相同的输入合并为 (掩码, 重复次数) 的游程，次数用变长整数编码。
+    # 每场战斗写入单独的文件：path的文件名后加序号（fight.rec -> fight-001.rec），跳过已存在的文件
+    def __init__(self, path):
+        self.path = path
+        self.fights = 0
+        self.fight_path = None
+        self.seed = None
+        self.runs = []
+        self.current = 0
+        self.length = 0
+        self.steps = 0
+
+    def next_path(self):
+        root, ext = os.path.splitext(self.path)
+        while True:
+            self.fights += 1
+            path = f'{root}-{self.fights:03d}{ext}'
+            if not os.path.exists(path):
+                return path
+
+    def begin(self, seed):
+        self.fight_path = self.next_path()
+        self.seed = seed
+        self.runs.clear()
+        self.current = 0
+        self.length = 0
+        self.steps = 0
+
+    def record(self, inputs):
+        if inputs != self.current and self.length:
+            self.runs.append((self.current, self.length))
+            self.length = 0
+        self.current = inputs
+        self.length += 1
+        self.steps += 1
+
+    def encode(self, result=None):
+        data = bytearray(REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, self.seed, FPS,
+                                            self.steps, REPLAY_RESULTS[result]))
+        runs = self.runs + [(self.current, self.length)] if self.length else self.runs
+        for inputs, length in runs:
+            data.append(inputs)
+            while length >= 0x80:
+                data.append(length & 0x7F | 0x80)
+                length >>= 7
+            data.append(length)
+        return bytes(data)
+
+    def save(self, result=None):
+        if self.seed is None:
+            return
+        with open(self.fight_path, 'wb') as f:
+            f.write(self.encode(result))
+
+class InputReplay:
+    # 读取InputRecorder写出的录像，按步依次给出输入位掩码
+    def __init__(self, seed, inputs, result=None):
+        self.seed = seed
+        self.inputs = inputs
+        self.result = result
+        self.position = 0
+
+    @classmethod
+    def decode(cls, data):
+        if len(data) < REPLAY_HEADER.size:
+            raise ValueError('录像数据不完整')
+        magic, version, seed, fps, steps, result = REPLAY_HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError('不是有效的录像文件')
+        if fps != FPS:
+            raise ValueError(f'录像的模拟帧率为{fps}，当前为{FPS}')
+        inputs = bytearray()
+        i = REPLAY_HEADER.size
+        while i < len(data):
+            value = data[i]
+            length = shift = 0
+            while True:
+                i += 1
+                if i >= len(data):
+                    raise ValueError('录像数据不完整')
+                byte = data[i]
+                length |= (byte & 0x7F) << shift
+                shift += 7
+                if byte < 0x80:
+                    break
+            i += 1
+            inputs.extend(bytes((value,)) * length)
+        if len(inputs) != steps:
+            raise ValueError('录像数据不完整')
+        results = {code: name for name, code in REPLAY_RESULTS.items()}
+        return cls(seed, inputs, results[result])
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.decode(f.read())
+
+    def __len__(self):
+        return len(self.inputs)
+
+    def done(self):
+        return self.position >= len(self.inputs)
+
+    def next(self):
+        inputs = self.inputs[self.position]
+        self.position += 1
+        return inputs
+
+# 世界分块参数：世界沿x轴切成等宽的块，只有相机附近的块留在内存中并参与模拟
+CHUNK_WIDTH = WINDOW_WIDTH
+CHUNK_BEHIND = 1  # 相机左侧保留的块数，更远的被回收
+CHUNK_AHEAD = 1   # 屏幕右侧提前生成的块数
+PLATFORM_HEIGHT = 16
+PICKUP_SIZE = 24
+PICKUP_HEAL = 20
+
+class Chunk:
+    # 世界中的一段：单向平台（可以从下方跳上去站立）、回血道具和敌人出生点，
+    # 全部由 (世界种子, 块编号) 决定，回收后再次进入时生成的内容完全相同
+    def __init__(self, index, seed):
+        self.index = index
+        self.left = index * CHUNK_WIDTH
+        self.platforms = []
+        self.pickups = []  # (编号, Rect)
+        self.spawns = []   # (编号, x, 类型)
+        if index == 0:
+            return  # 出发点保持空旷
+        rng = random.Random(seed * 1000003 + index)
+        for _ in range(rng.randint(0, 2)):
+            width = rng.randrange(160, 320, 16)
+            x = self.left + rng.randrange(0, CHUNK_WIDTH - width)
+            y = GROUND_HEIGHT - rng.choice((150, 230))
+            self.platforms.append(pygame.Rect(x, y, width, PLATFORM_HEIGHT))
+        if rng.random() < 0.35:
+            # 道具放在某个平台上方，没有平台时放在地面上
+            if self.platforms:
+                platform = rng.choice(self.platforms)
+                x, bottom = platform.centerx, platform.top - 8
+            else:
+                x, bottom = self.left + rng.randrange(100, CHUNK_WIDTH - 100), GROUND_HEIGHT - 8
+            rect = pygame.Rect(0, 0, PICKUP_SIZE, PICKUP_SIZE)
+            rect.midbottom = (x, bottom)
+            self.pickups.append((0, rect))
+        for i in range(rng.randint(0, 2)):
+            kind = rng.choice(('minion', 'minion', 'runner'))
+            self.spawns.append((i, self.left + rng.randrange(200, CHUNK_WIDTH), kind))
+
+class ChunkWorld:
+    # 按camera_x流式加载的分块世界：相机接近时才生成块，落到相机后方的块被回收，
+    # 内存和每步开销只取决于屏幕附近的块数。已拾取的道具和已触发的出生点按
+    # (块编号, 编号) 记下，块被回收后再生成也不会重复出现
+    def __init__(self, seed=0):
+        self.seed = seed
+        self.chunks = {}
+        self.used = set()
+        self.spawned = []  # 本步进入屏幕的出生点 (x, 类型)，由调用方消费
+        self.generated = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def update(self, camera_x):
+        first = max(0, int(camera_x // CHUNK_WIDTH) - CHUNK_BEHIND)
+        last = int((camera_x + WINDOW_WIDTH) // CHUNK_WIDTH) + CHUNK_AHEAD
+        for index in list(self.chunks):
+            if index < first or index > last:
+                del self.chunks[index]
+                self.evicted += 1
+        for index in range(first, last + 1):
+            if index not in self.chunks:
+                self.chunks[index] = Chunk(index, self.seed)
+                self.generated += 1
+
+        # 出生点进入屏幕右边缘时触发一次
+        self.spawned.clear()
+        edge = camera_x + WINDOW_WIDTH
+        for index, chunk in self.chunks.items():
+            for spawn_id, x, kind in chunk.spawns:
+                if x <= edge and (index, 'spawn', spawn_id) not in self.used:
+                    self.used.add((index, 'spawn', spawn_id))
+                    self.spawned.append((x, kind))
+
+    def nearby(self, rect):
+        # 只检查与rect所在位置相邻的块
+        index = rect.centerx // CHUNK_WIDTH
+        for i in (index - 1, index, index + 1):
+            chunk = self.chunks.get(i)
+            if chunk is not None:
+                yield chunk
+
+    def land(self, player):
+        # 单向平台：只在下落且上一步脚底还在平台之上时落到平台上
+        if player.velocity_y < 0:
+            return
+        rect = player.rect
+        prev_bottom = player.prev_y + rect.height
+        for chunk in self.nearby(rect):
+            for platform in chunk.platforms:
+                if (prev_bottom <= platform.top <= rect.bottom and
+                        rect.right > platform.left and rect.left < platform.right):
+                    rect.bottom = platform.top
+                    player.velocity_y = 0
+                    player.is_jumping = False
+                    return
+
+    def collect(self, player):
+        # 拾取与玩家重叠的道具，返回拾取的数量
+        collected = 0
+        for chunk in self.nearby(player.rect):
+            for pickup_id, rect in chunk.pickups:
+                key = (chunk.index, 'pickup', pickup_id)
+                if key not in self.used and player.rect.colliderect(rect):
+                    self.used.add(key)
+                    collected += 1
+        return collected
+
+    def draw(self, screen, camera_x, view=FULL_VIEW):
+        # 绘制屏幕内的平台和道具，返回绘制过的区域
+        drawn = []
+        camera_x = int(camera_x)
+        line = view.length(2)
+        inset_short, inset_long = view.length(8), view.length(16)
+        for chunk in self.chunks.values():
+            if chunk.left - camera_x >= WINDOW_WIDTH or chunk.left + CHUNK_WIDTH - camera_x <= 0:
+                continue
+            for platform in chunk.platforms:
+                rect = view.rect(platform.move(-camera_x, 0))
+                drawn.append(pygame.draw.rect(screen, WHITE, rect, line))
+            for pickup_id, pickup in chunk.pickups:
+                if (chunk.index, 'pickup', pickup_id) in self.used:
+                    continue
+                rect = view.rect(pickup.move(-camera_x, 0))
+                drawn.append(pygame.draw.rect(screen, RED, rect))
+                pygame.draw.rect(screen, WHITE, rect.inflate(-inset_short, -inset_long))
+                pygame.draw.rect(screen, WHITE, rect.inflate(-inset_long, -inset_short))
+        return drawn
+
+class Simulation:
+    # 一场玩家对BOSS战斗的模拟核心，与键盘、渲染、声音和screen/ui_manager全局变量无关。
+    # 每次step传入一步的输入位掩码，时间按TIME_STEP_MS显式推进，
+    # 唯一的随机来源是按种子生成的关卡块（见Chunk），同样的种子和输入序列总会得到同样的结果。
+    # 无窗口运行时，在导入本模块前设置 SDL_VIDEODRIVER=dummy 与 SDL_AUDIODRIVER=dummy。
+    def __init__(self, assets, seed=0):
+        self.seed = seed
+        self.time = 0  # 模拟时间（毫秒）
+        self.frame = 0
+        self.events = []  # 本步产生的声音事件，由调用方消费
+        self.player = Player(assets, self.events)
+        self.boss = Boss(assets, self.events)
+        self.collisions = CollisionSystem()
+        self.world = ChunkWorld(seed)
+        self.entities = EntitySystems(assets, self.events)
+        # 敌方系统：都提供update、damage、contact、cull、projectiles和绘制接口，
+        # 模拟和渲染对它们统一循环处理，不再逐个写BOSS和小兵的代码
+        self.enemies = [self.boss, self.entities]
+        self.stages = {self.boss: 'sim_boss', self.entities: 'sim_entities'}  # 分析器里的阶段名
+        # 绘制顺序：先画所有角色，再画所有子弹和投射物
+        self.actors = [self.entities, self.player, self.boss]
+        self.camera_x = 0
+        self.prev_camera_x = 0
+        self.total_distance = 0
+        self.result = None  # 'WIN' / 'LOSE'，未分出胜负时为None
+
+    def run(self, input_frames, max_steps=None):
+        # 按输入序列推进直到分出胜负、输入用完或达到步数上限
+        for inputs in input_frames:
+            if self.result is not None or (max_steps is not None and self.frame >= max_steps):
+                break
+            self.step(inputs)
+        return self.result
+
+    def step(self, inputs):
+        self.events.clear()
+        self.time += TIME_STEP_MS
+        self.frame += 1
+        current_time = self.time
+        player = self.player
+        boss = self.boss
+
+        with profiler.section('sim_move'):
+            self.move(inputs, current_time)
+
+        # 按相机位置加载和回收世界分块
+        with profiler.section('sim_world'):
+            self.world.update(self.camera_x)
+            for x, kind in self.world.spawned:
+                self.entities.spawn(kind, x)
+
+        # 更新玩家和子弹
+        with profiler.section('sim_player'):
+            player.update(current_time, self.camera_x)
+            self.world.land(player)
         
-        # 检查点是否在BOSS图像区域内
-        if (0 <= bullet_center_x < self.image.get_width() and 
-            0 <= bullet_center_y < self.image.get_height()):
-            # 放宽判定，只要在图像区域内就算命中
-            return True
-        return False
+        # 更新BOSS、小兵和它们的投射物（追踪弹和发射器瞄准玩家中心）
+        for enemy in self.enemies:
+            with profiler.section(self.stages[enemy]):
+                enemy.update(current_time, player.rect.center, self.camera_x)
 
-class Game:
+        with profiler.section('sim_collision'):
+            self.collide(current_time)
+
+        if player.health <= 0:
+            self.result = 'LOSE'
+        elif boss.health <= 0:
+            self.result = 'WIN'
+
+    def move(self, inputs, current_time):
+        player = self.player
+        boss = self.boss
+
+        # 记录上一步的位置，用于渲染插值
+        self.prev_camera_x = self.camera_x
+        player.prev_x = player.rect.x
+        player.prev_y = player.rect.y
+
+        # 移动和朝向控制
+        moving = False
+        if inputs & INPUT_LEFT:
+            move_amount = -player.speed
+            player.facing_left = True
+            moving = True
+            if player.is_jumping:
+                move_amount *= player.air_control
+
+            player_screen_x = player.rect.x - self.camera_x
+            
+            if player_screen_x < WINDOW_WIDTH * 0.3 and self.camera_x > 0:
+                camera_move = max(move_amount, -self.camera_x)
+                self.camera_x += camera_move
+                player.rect.x += move_amount
+            else:
+                new_x = max(0, player.rect.x + move_amount)
+                player.rect.x = new_x
+                
+        if inputs & INPUT_RIGHT:
+            move_amount = player.speed
+            player.facing_left = False
+            moving = True
+            if player.is_jumping:
+                move_amount *= player.air_control
+                
+            player_screen_x = player.rect.x - self.camera_x
+            
+            if player_screen_x > WINDOW_WIDTH * 0.4:
+                self.camera_x += move_amount
+                player.rect.x += move_amount
+            else:
+                player.rect.x += move_amount
+
+        player.is_running = moving
+
+        # 跳跃控制
+        if inputs & INPUT_JUMP and not player.is_jumping:
+            player.jump()
+
+        if moving:
+            self.total_distance += abs(move_amount)
+        
+        # 检查是否应该让BOSS出现
+        if self.total_distance >= BOSS_APPEAR_DISTANCE and not boss.has_appeared:
+            boss.has_appeared = True
+            # 让Boss类自行根据camera_x定位
+            boss.attack_timer = current_time
+            self.events.append('boss')
+
+    def collide(self, current_time):
+        player = self.player
+        collisions = self.collisions
+        # 按与玩家的相对运动对投射物做连续检测
+        player_move = (player.rect.x - player.prev_x, player.rect.y - player.prev_y)
+        for enemy in self.enemies:
+            # 1. 玩家子弹打中敌人，每颗子弹只算一次
+            for bullet in enemy.damage(player.bullets, player.bullet_damage, current_time, collisions):
+                player.bullets.release(bullet)
+                self.events.append('hit')
+
+            # 2. 敌人的投射物打中玩家
+            hits, _ = collisions.projectile_hits(enemy.projectiles, [player.rect], [player_move])
+            if len(hits):
+                hits = numpy.unique(hits)
+                enemy.projectiles.remove(hits)
+                for _ in hits:
+                    player.health -= 10  # 减少伤害
+                    self.events.append('hit')
+
+            # 3. 敌人撞到玩家，之后移除死亡和远离的敌人
+            damage = enemy.contact(player.rect)
+            if damage:
+                player.health -= damage
+                self.events.append('hit')
+            enemy.cull(self.camera_x)
+
+        # 4. 玩家拾取道具
+        for _ in range(self.world.collect(player)):
+            player.health = min(player.max_health, player.health + PICKUP_HEAL)
+            self.events.append('pickup')
+
+class DirtyRectTracker:
+    # 记录每帧绘制过的区域；上一帧与本帧区域的并集就是需要刷新到显示器的部分
     def __init__(self):
-        self.assets = GameAssets()
+        self.previous = []
+        self.current = []
+        self.full_redraw = True
+
+    def invalidate(self):
+        self.full_redraw = True
+
+    def mark_all(self, rects):
+        self.current.extend(rects)
+
+    def restore(self, screen, backdrop):
+        # 用静态背景擦除上一帧绘制的精灵
+        for rect in self.previous:
+            screen.blit(backdrop, rect, rect)
+
+    def flush(self):
+        if self.full_redraw:
+            pygame.display.flip()
+            self.full_redraw = False
+        elif self.previous or self.current:
+            pygame.display.update(self.previous + self.current)
+        self.previous = self.current
+        self.current = []
+
+class LowResTarget:
+    # 低分辨率渲染目标：背景、平台、精灵和投射物都在size大小的画布上合成，
+    # 精灵来自GameAssets按画布分辨率直接从源PNG缩放的第二套动画帧，每帧只放大一次到窗口。
+    # integer按整数倍放大并居中（多余部分留黑边），nearest用最近邻拉伸铺满窗口。
+    # 血条、文字和按钮在放大后按窗口分辨率绘制，保持清晰
+    def __init__(self, assets, size, upscale='integer'):
+        width, height = size
+        self.assets = assets
+        self.size = size
+        self.scale = WINDOW_WIDTH / width
+        self.canvas = pygame.Surface(size).convert()
+        self.background = Background(assets.bg, width, height)
+        start_ui = assets.start_ui
+        self.start_ui = pygame.transform.scale(
+            start_ui, (int(start_ui.get_width() * height / WINDOW_HEIGHT), height))
+        if upscale == 'integer':
+            factor = max(1, min(WINDOW_WIDTH // width, WINDOW_HEIGHT // height))
+            target = pygame.Rect(0, 0, width * factor, height * factor)
+        else:
+            target = pygame.Rect(0, 0, WINDOW_WIDTH, WINDOW_HEIGHT)
+        target.center = (WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2)
+        self.target = target
+        self.letterbox = target.size != (WINDOW_WIDTH, WINDOW_HEIGHT)
+        # 第二套动画帧和资源一起加载（见GameAssets.load_steps），绘制时不再生成
+        self.view = RenderView(self.scale, assets.low_res_frames)
+
+    def update(self, camera_x):
+        self.background.update(camera_x / self.scale)
+
+    def draw_backdrop(self, show_start_ui):
+        canvas = self.canvas
+        canvas.fill(BLACK)
+        self.background.draw(canvas)
+        if show_start_ui:
+            canvas.blit(self.start_ui, ((self.size[0] - self.start_ui.get_width()) // 2, 0))
+
+    def present(self, screen):
+        # 把画布放大到窗口（每帧唯一一次缩放）
+        if self.letterbox:
+            screen.fill(BLACK)
+            pygame.transform.scale(self.canvas, self.target.size, screen.subsurface(self.target))
+        else:
+            pygame.transform.scale(self.canvas, self.target.size, screen)
+
+class Game:
+    def __init__(self, assets=None, dirty_rects=False, max_fps=FPS, interpolate=True, recorder=None,
+                 low_res=None, upscale='integer'):
+        self.assets = assets if assets is not None else GameAssets()
         self.state = 'START'
+        # 唯一的时钟：只在run中每帧tick一次
         self.clock = pygame.time.Clock()
+        self.max_fps = max_fps  # 渲染帧率上限，0表示不限制
+        self.sim_time = 0  # 模拟时间（毫秒），每个固定步长推进TIME_STEP_MS
+        self.accumulator = 0.0
+        self.interpolate = interpolate
+        self.alpha = 1.0
+        self.sim = None
         self.player = None
         self.boss = None
+        self.pending_input = 0  # 两步之间按下的按键，合并到下一步的输入中
+        self.recorder = recorder  # 录制每场战斗的输入
+        self.replay = None  # 回放时代替键盘提供输入
         self.background = Background(self.assets.bg)
-        self.camera_x = 0
-        self.ui = PixelUI()
-        self.total_distance = 0
+        self.text = TextCache()
+        self.ui = PixelUI(self.text)
+        self.audio = AudioMixer()
         self.game_over_timer = 0
         self.debug = False  # 添加调试模式开关
+        # 脏矩形渲染模式：只重绘和刷新发生变化的区域
+        self.dirty_rects = dirty_rects
+        self.dirty = DirtyRectTracker()
+        self.backdrop = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT)).convert()
+        self.backdrop_cache_key = None
+        # 低分辨率渲染模式：low_res为画布尺寸 (宽, 高)，资源需要以同样的low_res加载
+        if low_res and self.assets.low_res != low_res:
+            raise ValueError('低分辨率模式需要以同样的low_res创建GameAssets')
+        self.low_res = LowResTarget(self.assets, low_res, upscale) if low_res else None
         
     def reset_game(self):
         self.state = 'START'
+        self.sim = None
         self.player = None
         self.boss = None
-        self.camera_x = 0
-        self.total_distance = 0
+        self.pending_input = 0
         self.game_over_timer = 0
+        self.update_background(0)
         start_button.show()
         exit_button.show()
 
+    def start_fight(self, seed):
+        self.state = 'PLAYING'
+        self.sim = Simulation(self.assets, seed=seed)
+        self.player = self.sim.player
+        self.boss = self.sim.boss
+        self.audio.attach(self.assets.sounds)
+        if self.recorder is not None:
+            self.recorder.begin(seed)
+        start_button.hide()
+        exit_button.hide()
+
     def handle_events(self):
-        time_delta = self.clock.tick(60)/1000.0
-        
         for event in pygame.event.get():
             if event.type == QUIT:
                 return False
                 
             if event.type == gui.UI_BUTTON_PRESSED:
                 if event.ui_element == start_button:
-                    self.state = 'PLAYING'
-                    self.player = Player(self.assets)
-                    self.boss = Boss(self.assets)
-                    start_button.hide()
-                    exit_button.hide()
+                    self.start_fight(random.randrange(2**32))
                 elif event.ui_element == exit_button:
                     return False
                     
+            if event.type == KEYDOWN and event.key == K_F3:
+                profiler.toggle()
+
             if self.state == 'PLAYING':
                 if event.type == KEYDOWN:
                     if event.key == K_SPACE:
-                        self.player.jump()
+                        self.pending_input |= INPUT_JUMP
                         
             ui_manager.process_events(event)
             
-        ui_manager.update(time_delta)
         return True
 
     def update(self):
+        # 推进一个固定步长
+        self.sim_time += TIME_STEP_MS
         if self.state == 'PLAYING':
-            current_time = pygame.time.get_ticks()
-            
-            # 更新玩家
-            keys = pygame.key.get_pressed()
-            
-            # 移动和朝向控制
-            moving = False
-            if keys[K_LEFT]:
-                move_amount = -self.player.speed
-                self.player.facing_left = True
-                moving = True
-                if self.player.is_jumping:
-                    move_amount *= self.player.air_control
-
-                player_screen_x = self.player.rect.x - self.camera_x
-                
-                if player_screen_x < WINDOW_WIDTH * 0.3 and self.camera_x > 0:
-                    camera_move = max(move_amount, -self.camera_x)
-                    self.camera_x += camera_move
-                    self.player.rect.x += move_amount
-                else:
-                    new_x = max(0, self.player.rect.x + move_amount)
-                    self.player.rect.x = new_x
-                    
-            if keys[K_RIGHT]:
-                move_amount = self.player.speed
-                self.player.facing_left = False
-                moving = True
-                if self.player.is_jumping:
-                    move_amount *= self.player.air_control
-                    
-                player_screen_x = self.player.rect.x - self.camera_x
-                
-                if player_screen_x > WINDOW_WIDTH * 0.4:
-                    self.camera_x += move_amount
-                    self.player.rect.x += move_amount
-                else:
-                    self.player.rect.x += move_amount
-
-            self.player.is_running = moving
+            if self.replay is not None:
+                inputs = self.replay.next()
+            else:
+                inputs = read_input() | self.pending_input
+            self.pending_input = 0
+            if self.recorder is not None:
+                self.recorder.record(inputs)
+            self.sim.step(inputs)
+            self.play_sounds(self.sim.events)
 
-            # 跳跃控制
-            if keys[K_SPACE] and not self.player.is_jumping:
-                self.player.jump()
-
-            if moving:
-                self.total_distance += abs(move_amount)
-            
-            # 检查是否应该让BOSS出现
-            if self.total_distance >= BOSS_APPEAR_DISTANCE and not self.boss.has_appeared:
-                self.boss.has_appeared = True
-                # 让Boss类自行根据camera_x定位
-                self.boss.attack_timer = current_time
-                boss_sound.play()
-
-            # 更新玩家和子弹
-            self.player.update(current_time)
-            
-            # 更新BOSS
-            if self.boss.has_appeared:
-                self.boss.update(current_time, self.player.rect.x, self.camera_x)
-                self.background.update(self.camera_x)
-
-            # 碰撞检测
-            # 1. 玩家子弹和BOSS的碰撞
-            for bullet in self.player.bullets[:]:
-                if self.boss.has_appeared and self.boss.rect.colliderect(bullet.rect):
-                    if self.boss.check_bullet_collision(bullet, self.camera_x):
-                        self.boss.take_damage(self.player.bullet_damage, current_time)
-                        self.player.bullets.remove(bullet)
-                        hit_sound.play()
-                        if self.boss.health <= 0:
-                            self.state = 'GAME_OVER'
-                            self.game_over_timer = current_time
-
-            # 2. BOSS子弹和玩家的碰撞
-            for projectile in self.boss.projectiles[:]:
-                projectile_screen_x = projectile.rect.x - self.camera_x
-                projectile_rect = projectile.rect.copy()
-                projectile_rect.x = projectile_screen_x
-                
-                player_screen_x = self.player.rect.x - self.camera_x
-                player_rect = self.player.rect.copy()
-                player_rect.x = player_screen_x
-                
-                if projectile_rect.colliderect(player_rect):
-                    self.player.health -= 10  # 减少伤害
-                    self.boss.projectiles.remove(projectile)
-                    hit_sound.play()
-                    if self.player.health <= 0:
-                        self.state = 'GAME_OVER'
-                        self.game_over_timer = current_time
+            if self.sim.result is not None:
+                self.state = 'GAME_OVER'
+                self.game_over_timer = self.sim_time
+                if self.recorder is not None:
+                    self.recorder.save(self.sim.result)
 
         elif self.state == 'GAME_OVER':
-            current_time = pygame.time.get_ticks()
+            current_time = self.sim_time
             # 3秒后返回主界面
             if current_time - self.game_over_timer > 3000:
                 self.reset_game()
 
-    def draw(self):
+    def play_sounds(self, events):
+        for event in events:
+            self.audio.play(event, self.sim_time)
+
+    def update_background(self, camera_x):
+        self.background.update(camera_x)
+        if self.low_res is not None:
+            self.low_res.update(camera_x)
+
+    def draw(self, alpha=1.0):
+        self.alpha = alpha
+        if self.sim is not None:
+            # 背景视差跟随插值后的相机，与精灵按同一位置滚动
+            self.update_background(self.lerp(self.sim.prev_camera_x, self.sim.camera_x))
+        if self.low_res is not None:
+            self.draw_low_res()
+        elif self.dirty_rects:
+            self.draw_dirty()
+        else:
+            # 清空屏幕并绘制背景
+            with profiler.section('draw_backdrop'):
+                self.draw_backdrop(screen)
+            with profiler.section('draw_sprites'):
+                self.draw_sprites(screen)
+            self.draw_overlay(screen)
+            with profiler.section('present'):
+                pygame.display.flip()
+
+    def draw_overlay(self, surface):
+        # 分析器浮层，返回绘制过的区域
+        if not profiler.enabled:
+            return []
+        with profiler.section('draw_overlay'):
+            return [profiler.draw(surface, self.text)]
+
+    def entity_counts(self):
+        if self.sim is None:
+            return {}
+        bullets = self.player.bullets
+        projectiles = self.boss.projectiles
+        return {'bullets': len(bullets), 'projectiles': len(projectiles),
+                'bullet_hit_rate': round(bullets.hit_rate, 4),
+                'projectile_hit_rate': round(projectiles.hit_rate, 4),
+                'chunks': len(self.sim.world), 'minions': len(self.sim.entities)}
+
+    def lerp(self, previous, current):
+        # 在上一步与当前步之间插值
+        return previous + (current - previous) * self.alpha
+
+    def backdrop_key(self):
+        # 静态背景只取决于状态和背景的滚动位置
+        return (self.state, self.background.offsets())
+
+    def draw_dirty(self):
+        # 脏矩形模式：背景不变时只用静态背景覆盖上一帧绘制过的区域，
+        # 再绘制本帧的精灵并只刷新变化的区域
+        key = self.backdrop_key()
+        with profiler.section('draw_backdrop'):
+            if key != self.backdrop_cache_key:
+                self.backdrop_cache_key = key
+                self.draw_backdrop(self.backdrop)
+                screen.blit(self.backdrop, (0, 0))
+                self.dirty.invalidate()
+            else:
+                self.dirty.restore(screen, self.backdrop)
+        with profiler.section('draw_sprites'):
+            self.dirty.mark_all(self.draw_sprites(screen))
+        self.dirty.mark_all(self.draw_overlay(screen))
+        with profiler.section('present'):
+            self.dirty.flush()
+
+    def draw_low_res(self):
+        # 低分辨率模式：背景和战斗画面在画布上合成，放大一次到窗口后再绘制界面
+        low_res = self.low_res
+        with profiler.section('draw_backdrop'):
+            low_res.draw_backdrop(self.state == 'START')
+        with profiler.section('draw_sprites'):
+            if self.state != 'START':
+                self.draw_world(low_res.canvas, low_res.view)
+        with profiler.section('upscale'):
+            low_res.present(screen)
+        with profiler.section('draw_sprites'):
+            self.draw_hud(screen)
+        self.draw_overlay(screen)
+        with profiler.section('present'):
+            pygame.display.flip()
+
+    def draw_backdrop(self, surface):
         # 清空屏幕
-        screen.fill(BLACK)
+        surface.fill(BLACK)
         
         # 绘制背景
-        self.background.draw(screen)
+        self.background.draw(surface)
         
         if self.state == 'START':
             # 居中绘制开始界面
             start_x = (WINDOW_WIDTH - self.assets.start_ui.get_width()) // 2
-            screen.blit(self.assets.start_ui, (start_x, 0))
+            surface.blit(self.assets.start_ui, (start_x, 0))
+
+    def draw_sprites(self, screen):
+        # 绘制会变化的内容，返回本帧绘制过的区域
+        drawn = self.draw_world(screen, FULL_VIEW)
+        drawn.extend(self.draw_hud(screen))
+        return drawn
+
+    def draw_world(self, surface, view):
+        # 绘制随相机移动的战斗画面（平台、所有角色、子弹和投射物、地面），游戏结束后继续绘制最后一步的画面；
+        # view把世界坐标映射到surface的分辨率，返回绘制过的区域
+        drawn = []
+        if self.sim is None or self.state not in ('PLAYING', 'GAME_OVER'):
+            return drawn
+        # 所有游戏对象都按插值后的相机位置绘制
+        camera_x = self.lerp(self.sim.prev_camera_x, self.sim.camera_x)
+        drawn.extend(self.sim.world.draw(surface, camera_x, view))
+        for actor in self.sim.actors:
+            drawn.extend(actor.draw(surface, camera_x, self.alpha, view))
+        for actor in self.sim.actors:
+            drawn.extend(actor.draw_projectiles(surface, camera_x, self.alpha, view))
+
+        # 绘制地面
+        ground_y = int(GROUND_HEIGHT / view.scale)
+        drawn.append(pygame.draw.line(surface, WHITE, (0, ground_y),
+                                      (surface.get_width(), ground_y), view.length(2)))
+        return drawn
+
+    def draw_hud(self, screen):
+        # 绘制不随相机移动的界面（按钮、血条、文字），总是按窗口分辨率绘制，返回绘制过的区域
+        drawn = []
+        if self.state == 'START':
             ui_manager.draw_ui(screen)
+            drawn.append(start_button.rect)
+            drawn.append(exit_button.rect)
             
         elif self.state == 'PLAYING':
-            # 计算所有游戏对象相对于相机的位置
-            player_screen_x = self.player.rect.x - self.camera_x
-            player_rect = self.player.rect.copy()
-            player_rect.x = player_screen_x
-            screen.blit(self.player.image, player_rect)
-            
-            # 绘制BOSS（如果出现）
-            if self.boss.has_appeared:
-                boss_screen_x = self.boss.rect.x - self.camera_x
-                boss_rect = self.boss.rect.copy()
-                boss_rect.x = boss_screen_x
-                self.boss.draw(screen, boss_rect)
-            
-                # 调试模式 - 显示BOSS位置信息
-                if self.debug:
-                    font = pygame.font.Font(None, 24)
-                    debug_text = f"BOSS: x={self.boss.rect.x}, screen_x={boss_screen_x}"
-                    text_surf = font.render(debug_text, True, WHITE)
-                    screen.blit(text_surf, (10, 40))
-            
-            # 绘制玩家子弹
-            for bullet in self.player.bullets:
-                bullet_screen_x = bullet.rect.x - self.camera_x
-                bullet_rect = bullet.rect.copy()
-                bullet_rect.x = bullet_screen_x
-                pygame.draw.rect(screen, WHITE, bullet_rect)
-            
-            # 绘制BOSS的投射物 (使用相机偏移)
-            if self.boss.has_appeared:
-                for projectile in self.boss.projectiles:
-                    projectile_screen_rect = projectile.rect.copy()
-                    projectile_screen_rect.x -= self.camera_x
-                    projectile.draw(screen, projectile_screen_rect)
+            # 调试模式 - 显示BOSS位置信息
+            if self.boss.has_appeared and self.debug:
+                debug_text = f"BOSS: x={self.boss.rect.x}, screen_x={self.boss.rect.x - self.sim.camera_x}"
+                text_surf = self.text.render(debug_text, 24, WHITE)
+                drawn.append(screen.blit(text_surf, (10, 40)))
             
             # UI元素不需要考虑相机位置
-            self.ui.draw_health_bar(screen, 10, 10, 200, 
-                                  self.player.health, 100, RED)
+            drawn.append(self.ui.draw_health_bar(screen, 10, 10, 200,
+                                                 self.player.health, self.player.max_health, RED))
             if self.boss.has_appeared:
                 boss_health_x = WINDOW_WIDTH - 210
-                self.ui.draw_health_bar(screen, boss_health_x, 10, 200,
-                                      self.boss.health, self.boss.max_health, RED)
-            
-            # 绘制地面
-            pygame.draw.line(screen, WHITE, (0, GROUND_HEIGHT), 
-                           (WINDOW_WIDTH, GROUND_HEIGHT), 2)
+                drawn.append(self.ui.draw_health_bar(screen, boss_health_x, 10, 200,
+                                                     self.boss.health, self.boss.max_health, RED))
             
         elif self.state == 'GAME_OVER':
-            # 继续绘制游戏画面
-            if self.player:
-                screen.blit(self.player.image, self.player.rect)
-            if self.boss and self.boss.has_appeared:
-                screen.blit(self.boss.image, self.boss.rect)
-            
             # 绘制游戏结束文本
-            font = pygame.font.Font(None, 74)
             if self.player.health <= 0:
-                text = font.render('GAME OVER', True, RED)
+                text = self.text.render('GAME OVER', 74, RED)
             else:
-                text = font.render('YOU WIN!', True, WHITE)
+                text = self.text.render('YOU WIN!', 74, WHITE)
             text_rect = text.get_rect(center=(WINDOW_WIDTH//2, WINDOW_HEIGHT//2))
-            screen.blit(text, text_rect)
+            drawn.append(screen.blit(text, text_rect))
             
             # 显示返回提示
-            font_small = pygame.font.Font(None, 36)
-            return_text = font_small.render('Returning to main menu...', True, WHITE)
+            return_text = self.text.render('Returning to main menu...', 36, WHITE)
             return_rect = return_text.get_rect(center=(WINDOW_WIDTH//2, WINDOW_HEIGHT//2 + 50))
-            screen.blit(return_text, return_rect)
-        
-        pygame.display.flip()
-        self.clock.tick(60)
+            drawn.append(screen.blit(return_text, return_rect))
+        return drawn
+
+    def freeze_heap(self):
+        # 资源加载完后把启动期创建的长期对象移入永久代，
+        # 之后的分代GC不再反复扫描它们，减少帧时间尖峰
+        gc.collect()
+        gc.freeze()
 
     def run(self):
+        loader = None
+        if not self.assets.ready:
+            # 资源在后台线程加载完成前先禁用开始按钮
+            start_button.disable()
+            loader = self.assets.load_in_background()
+        else:
+            self.freeze_heap()
         running = True
         while running:
+            if loader is not None and not loader.is_alive():
+                if not self.assets.ready:
+                    raise RuntimeError('资源加载失败')
+                loader = None
+                self.freeze_heap()
+                start_button.enable()
+            frame_ms = self.clock.tick(self.max_fps)
+            running = self.advance(frame_ms)
+
+    async def run_async(self):
+        # 网页端(pygbag)的主循环：每帧让出一次事件循环，避免阻塞浏览器
+        loader = None
+        if not self.assets.ready:
+            # 资源在后台加载完成前先禁用开始按钮
+            start_button.disable()
+            loader = asyncio.ensure_future(self.assets.load_async())
+        else:
+            self.freeze_heap()
+        running = True
+        while running:
+            if loader is not None and loader.done():
+                loader.result()
+                loader = None
+                self.freeze_heap()
+                start_button.enable()
+            frame_ms = self.clock.tick(self.max_fps)
+            running = self.advance(frame_ms)
+            await asyncio.sleep(0)
+
+    def run_replay(self, replay, render=True):
+        # 回放模式：不调用clock.tick，每帧推进一步，尽可能快地跑完录像；
+        # render为False时只做模拟（和音效调度），不绘制
+        self.replay = replay
+        self.start_fight(replay.seed)
+        start = time.perf_counter()
+        while self.state == 'PLAYING' and not replay.done():
+            profiler.begin_frame()
+            pygame.event.pump()
+            self.update()
+            if render:
+                self.draw()
+            if profiler.enabled:
+                profiler.end_frame(self.entity_counts())
+        elapsed = time.perf_counter() - start
+        self.replay = None
+        return {'steps': self.sim.frame, 'result': self.sim.result, 'recorded_result': replay.result,
+                'elapsed': elapsed, 'steps_per_second': self.sim.frame / elapsed if elapsed else 0.0}
+
+    def advance(self, frame_ms):
+        # 处理一帧：事件、若干个固定步长的模拟、一次渲染
+        profiler.begin_frame()
+        with profiler.section('events'):
             running = self.handle_events()
+        with profiler.section('ui_update'):
+            ui_manager.update(frame_ms / 1000.0)
+        # 限制累积时间，避免卡顿后一次追赶太多步
+        self.accumulator += min(frame_ms, TIME_STEP_MS * MAX_STEPS_PER_FRAME)
+        while self.accumulator >= TIME_STEP_MS:
             self.update()
-            self.draw()
+            self.accumulator -= TIME_STEP_MS
+        alpha = self.accumulator / TIME_STEP_MS if self.interpolate else 1.0
+        self.draw(alpha)
+        # 分析器关闭时连实体计数也不统计
+        if profiler.enabled:
+            profiler.end_frame(self.entity_counts())
+        return running
 
 if __name__ == '__main__':
-    game = Game()
-    game.run()
-    pygame.quit()
-    sys.exit() 
\ No newline at end of file
+    if sys.platform == 'emscripten':
+        # pygbag：异步主循环，资源在后台加载
+        game = Game(GameAssets(lazy=True))
+        asyncio.run(game.run_async())
+    else:
+        parser = argparse.ArgumentParser(description='Trump VS BOSS')
+        parser.add_argument('--dirty-rects', action='store_true', help='只重绘和刷新变化的区域')
+        parser.add_argument('--profile', action='store_true', help='启动时打开帧分析器浮层（F3切换）')
+        parser.add_argument('--profile-trace', metavar='PATH', help='逐帧写入分析数据（.csv或.jsonl）')
+        parser.add_argument('--record', metavar='PATH', help='把每场战斗的输入分别录制到文件，文件名后加序号（fight.rec -> fight-001.rec）')
+        parser.add_argument('--replay', metavar='PATH', help='不限帧率地回放录像')
+        parser.add_argument('--no-render', action='store_true', help='回放时不渲染画面')
+        parser.add_argument('--low-res', choices=LOW_RES_SIZES, help='在低分辨率画布上合成画面，每帧放大一次到窗口')
+        parser.add_argument('--upscale', choices=UPSCALE_MODES, default='integer',
+                            help='低分辨率画布的放大方式：整数倍（留黑边）或最近邻拉伸')
+        args = parser.parse_args()
+        if args.low_res and args.dirty_rects:
+            parser.error('--low-res每帧都放大整个画布，不能和--dirty-rects同时使用')
+        if args.no_render and not args.replay:
+            parser.error('--no-render只能和--replay一起使用')
+        if args.record and args.replay:
+            parser.error('--record录制的是玩家的输入，不能和--replay同时使用')
+        low_res = tuple(int(n) for n in args.low_res.split('x')) if args.low_res else None
+
+        if args.profile or args.profile_trace:
+            profiler.enabled = True
+        if args.profile_trace:
+            profiler.open_trace(args.profile_trace)
+        recorder = InputRecorder(args.record) if args.record else None
+        try:
+            if args.replay:
+                game = Game(GameAssets(low_res=low_res), dirty_rects=args.dirty_rects,
+                            low_res=low_res, upscale=args.upscale)
+                stats = game.run_replay(InputReplay.load(args.replay), render=not args.no_render)
+                print(f"{stats['steps']} steps in {stats['elapsed']:.2f}s "
+                      f"({stats['steps_per_second']:.0f} steps/s), result {stats['result']}")
+                if stats['result'] != stats['recorded_result']:
+                    print(f"warning: recorded result was {stats['recorded_result']}")
+            else:
+                game = Game(GameAssets(lazy=True, low_res=low_res), dirty_rects=args.dirty_rects,
+                            recorder=recorder, low_res=low_res, upscale=args.upscale)
+                try:
+                    game.run()
+                finally:
+                    # 中途退出时也保存未打完的战斗
+                    if recorder is not None and game.state == 'PLAYING':
+                        recorder.save()
+        finally:
+            profiler.close_trace()
+        pygame.quit()
+        sys.exit() 
\ No newline at end of file
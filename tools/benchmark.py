@@ -0,0 +1,238 @@
+# 性能基准测试：在无窗口模式下驱动游戏中的真实类，按实体数量逐级加压，
+# 统计每个阶段每帧的耗时(ms)和临时内存分配，结果可保存为JSON用于对比不同提交。
+#
+# 用法：
+#   python tools/benchmark.py                       # 打印结果表
+#   python tools/benchmark.py --json new.json       # 保存结果
+#   python tools/benchmark.py --compare old.json    # 与之前的结果对比
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+import tracemalloc
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT)  # 资源路径都是相对项目根目录的
+sys.path.insert(0, ROOT)
+
+import numpy
+import pygame
+import main
+
+COUNTS = [16, 64, 256, 1024]
+
+def measure(frame, frames, setup=None, alloc_frames=20):
+    # 第一遍计时，第二遍在tracemalloc下统计每帧临时分配的峰值
+    times = []
+    for _ in range(frames):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        frame()
+        times.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    peaks = []
+    for _ in range(alloc_frames):
+        if setup:
+            setup()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        frame()
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    times.sort()
+    return {
+        'ms_mean': sum(times) / len(times),
+        'ms_p50': times[len(times) // 2],
+        'ms_p95': times[min(len(times) - 1, int(len(times) * 0.95))],
+        'alloc_kb': sum(peaks) / len(peaks) / 1024,
+    }
+
+def fill_projectiles(boss, count, rng):
+    # 用BOSS的弹幕填充投射物池，再把它们随机分布到屏幕内
+    pool = boss.projectiles
+    pool.clear()
+    pattern = 0
+    while len(pool) < count:
+        boss.fire_pattern(pattern, 0)
+        pattern = (pattern + 1) % len(boss.patterns)
+    pool.count = count
+    pool.x[:count] = [rng.uniform(0, main.WINDOW_WIDTH) for _ in range(count)]
+    pool.y[:count] = [rng.uniform(0, main.WINDOW_HEIGHT) for _ in range(count)]
+    pool.prev_x[:count] = pool.x[:count]
+    pool.prev_y[:count] = pool.y[:count]
+    pool.lifetime[:count] = 0
+
+def snapshot_pool(pool):
+    return pool.count, {name: getattr(pool, name).copy() for name in pool.FIELDS}
+
+def restore_pool(pool, saved):
+    pool.count, arrays = saved
+    for name, array in arrays.items():
+        getattr(pool, name)[:len(array)] = array
+
+def fill_bullets(player, count, rng):
+    player.bullets = main.BulletPool(capacity=count)
+    for _ in range(count):
+        player.bullets.spawn(rng.randrange(main.WINDOW_WIDTH), rng.randrange(main.GROUND_HEIGHT),
+                             rng.choice((-1, 1)), player.bullet_speed)
+
+def new_boss(assets):
+    boss = main.Boss(assets)
+    boss.has_appeared = True
+    boss.rect.x = boss.screen_offset
+    return boss
+
+def stages(assets, screen, frames):
+    rng = random.Random(0)
+
+    # 1. 每种弹幕各发射一轮
+    boss = new_boss(assets)
+    for pattern, spec in enumerate(main.BULLET_PATTERNS):
+        def setup(boss=boss):
+            boss.projectiles.clear()
+        def frame(boss=boss, pattern=pattern):
+            boss.fire_pattern(pattern, 1000)
+        setup()
+        frame()
+        yield 'shoot_' + spec['name'], len(boss.projectiles), frame, setup
+
+    for count in COUNTS:
+        # 2. 投射物更新与绘制
+        boss = new_boss(assets)
+        fill_projectiles(boss, count, rng)
+        saved = snapshot_pool(boss.projectiles)
+        yield ('projectile_update', count,
+               lambda boss=boss: boss.projectiles.update(0),
+               lambda boss=boss, saved=saved: restore_pool(boss.projectiles, saved))
+        yield 'projectile_draw', count, lambda boss=boss: boss.projectiles.draw(screen, 0), None
+
+        # 3. 带着大量子弹的玩家更新
+        player = main.Player(assets)
+        fill_bullets(player, count, rng)
+        positions = [(bullet.rect.x, bullet.direction) for bullet in player.bullets]
+        def restore_bullets(player=player, positions=positions):
+            bullets = player.bullets
+            bullets.clear()
+            for x, direction in positions:
+                bullets.spawn(x, 300, direction, player.bullet_speed)
+        clock = iter(range(0, 10 ** 9, 16))
+        yield ('player_update', count,
+               lambda player=player, clock=clock: player.update(next(clock), 0),
+               restore_bullets)
+
+        # 4. 碰撞检测：投射物对玩家、子弹对BOSS
+        collisions = main.CollisionSystem()
+        player.rect.center = (main.WINDOW_WIDTH // 2, main.GROUND_HEIGHT - 60)
+        restore_bullets()
+        def collide(boss=boss, player=player, collisions=collisions):
+            collisions.projectile_hits(boss.projectiles, [player.rect])
+            for bullet, _ in collisions.bullet_hits(player.bullets, [boss.rect]):
+                boss.check_bullet_collision(bullet)
+        yield 'collision', count, collide, None
+
+        # 5. 小兵：实体系统的更新（不含发射的子弹）与绘制
+        entities = main.EntitySystems(assets)
+        for i in range(count):
+            entities.spawn('minion' if i % 3 else 'runner', rng.uniform(0, main.WINDOW_WIDTH))
+        saved = snapshot_pool(entities.store)
+        def update_entities(entities=entities):
+            entities.update(0, (main.WINDOW_WIDTH // 2, main.GROUND_HEIGHT - 60), 0)
+            entities.projectiles.clear()
+        yield ('entity_update', count, update_entities,
+               lambda entities=entities, saved=saved: restore_pool(entities.store, saved))
+        yield 'entity_draw', count, lambda entities=entities: entities.draw(screen, 0), None
+
+    # 6. 背景与血条
+    background = main.Background(assets.bg)
+    offsets = iter(range(10 ** 9))
+    def draw_background():
+        background.update(next(offsets) * 7)
+        background.draw(screen)
+    yield 'background_draw', 1, draw_background, None
+
+    ui = main.PixelUI(main.TextCache())
+    yield 'health_bar_static', 2, lambda: (ui.draw_health_bar(screen, 10, 10, 200, 80, 100, main.RED),
+                                           ui.draw_health_bar(screen, 1070, 10, 200, 300, 400, main.RED)), None
+    health = iter(range(10 ** 9))
+    yield 'health_bar_changing', 2, lambda: (ui.draw_health_bar(screen, 10, 10, 200, next(health) % 100, 100, main.RED),
+                                             ui.draw_health_bar(screen, 1070, 10, 200, next(health) % 400, 400, main.RED)), None
+
+    # 7. 低分辨率画布：背景绘制到画布，再放大一次到窗口
+    for size in main.LOW_RES_SIZES:
+        width, height = (int(n) for n in size.split('x'))
+        target = main.LowResTarget(assets, (width, height))
+        def draw_low_res(target=target):
+            target.update(next(offsets) * 7)
+            target.draw_backdrop(False)
+            target.present(screen)
+        yield 'low_res_' + size, 1, draw_low_res, None
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(frames, only=None):
+    assets = main.GameAssets()
+    screen = main.screen
+    results = []
+    for name, count, frame, setup in stages(assets, screen, frames):
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        result = {'stage': name, 'count': count}
+        result.update(measure(frame, frames, setup))
+        results.append(result)
+        print(f"{name:22s} {count:6d}  {result['ms_mean']:8.3f} ms  p95 {result['ms_p95']:8.3f} ms"
+              f"  alloc {result['alloc_kb']:8.1f} KB", flush=True)
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'numpy': numpy.__version__,
+        'frames': frames,
+        'results': results,
+    }
+
+def compare(report, baseline):
+    # 按 (阶段, 数量) 对比平均耗时
+    old = {(r['stage'], r['count']): r for r in baseline['results']}
+    print(f"\ncompared with {baseline.get('commit')}:")
+    for result in report['results']:
+        previous = old.get((result['stage'], result['count']))
+        if previous is None or previous['ms_mean'] == 0:
+            continue
+        ratio = result['ms_mean'] / previous['ms_mean']
+        flag = '  REGRESSION' if ratio > 1.2 else ''
+        print(f"{result['stage']:22s} {result['count']:6d}  {previous['ms_mean']:8.3f} -> "
+              f"{result['ms_mean']:8.3f} ms  x{ratio:.2f}{flag}")
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='Trump VS BOSS benchmark')
+    parser.add_argument('--frames', type=int, default=200, help='每个阶段计时的帧数')
+    parser.add_argument('--only', nargs='*', help='只运行以这些前缀开头的阶段')
+    parser.add_argument('--json', help='把结果保存为JSON')
+    parser.add_argument('--compare', help='与之前保存的JSON结果对比')
+    args = parser.parse_args()
+
+    report = run(args.frames, args.only)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,407 @@
+# 批量对战：用进程池在所有CPU核上并行跑大量 玩家 vs BOSS 的无窗口战斗，
+# 玩家由脚本化的躲避机器人操作，按参数组合汇总胜率、击杀用时、存活时间、造成和受到的伤害以及投射物峰值，写入CSV。
+#
+# 用法：
+#   python tools/fight_sweep.py                                   # 默认参数组合
+#   python tools/fight_sweep.py --boss-health 300 400 --attack-delay 400 600 800 \
+#       --projectile-speed 6 8 10 --bullet-damage 5 --seeds 16 --out sweep.csv
+#   python tools/fight_sweep.py --bot idle                        # 原地不动的基线
+#   python tools/fight_sweep.py --check                           # 默认参数下躲避机器人必须胜过基线
+import os
+import sys
+import csv
+import time
+import random
+import argparse
+import itertools
+import multiprocessing
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT)  # 资源路径都是相对项目根目录的
+sys.path.insert(0, ROOT)
+
+import numpy
+import main
+
+PARAMS = ('boss_health', 'attack_delay', 'projectile_speed', 'bullet_damage')
+LOOKAHEAD = 100  # 机器人预判的步数，要覆盖追踪弹蓄力、转身再追上玩家的大部分时间
+SWITCH_STEPS = (2, 6, 14, 30)  # 候选操作序列在这些步数之后切换到第二个操作
+REPLAN_STEPS = 40  # 没有新的投射物或小兵时，最多沿用同一个序列的步数
+MUTATIONS = 48  # 每次规划时在当前的最优序列上随机改动一段得到的候选数
+FIRE_WEIGHT = 0.01  # 每步面向BOSS（自动射击能打中）的得分，远小于一次命中
+PROGRESS_WEIGHT = 0.01  # BOSS出现前每步向右前进的得分
+CORNER_X = 1000  # 玩家左上角离世界左端小于这个距离时算作退路不足（相机停在世界左端，躲不开迎面的弹幕）
+CORNER_WEIGHT = 0.02  # 无路可退的每一步的扣分
+
+# 每个工作进程只加载一次资源
+assets = None
+
+def init_worker():
+    global assets
+    assets = main.GameAssets()
+
+# 机器人每步可选的操作
+ACTIONS = (0, main.INPUT_RIGHT, main.INPUT_LEFT, main.INPUT_JUMP,
+           main.INPUT_JUMP | main.INPUT_LEFT, main.INPUT_JUMP | main.INPUT_RIGHT)
+
+def build_plans():
+    # 候选的短操作序列：先保持一个操作若干步，再换成另一个操作直到LOOKAHEAD，
+    # 形状为 (序列数, LOOKAHEAD)
+    plans = {tuple([first] * LOOKAHEAD) for first in ACTIONS}
+    for switch in SWITCH_STEPS:
+        for first in ACTIONS:
+            for second in ACTIONS:
+                plans.add(tuple([first] * switch + [second] * (LOOKAHEAD - switch)))
+    return numpy.array(sorted(plans), numpy.int32)
+
+PLANS = build_plans()
+
+def predict_paths(player, platforms, plans=PLANS):
+    # 按模拟里的移动、跳跃、重力和单向平台规则，同时推演所有操作序列；
+    # 返回每一步玩家左上角的位置和是否面朝右，形状都为 (序列数, LOOKAHEAD)
+    count = len(plans)
+    width, height = player.rect.size
+    x = numpy.full(count, player.rect.x, numpy.float32)
+    y = numpy.full(count, player.rect.y, numpy.float32)
+    velocity_y = numpy.full(count, player.velocity_y, numpy.float32)
+    jumping = numpy.full(count, player.is_jumping)
+    xs = numpy.empty((count, LOOKAHEAD), numpy.float32)
+    ys = numpy.empty((count, LOOKAHEAD), numpy.float32)
+    bottom = main.GROUND_HEIGHT - height
+    tops, lefts, rights = (numpy.array([[getattr(platform, side)] for platform in platforms], numpy.float32)
+                           for side in ('top', 'left', 'right'))
+    # 与位置无关的部分整段算好：每一步的水平移动、是否按跳跃、朝向（沿用最近一次按下的方向）
+    left = (plans & main.INPUT_LEFT) != 0
+    right = (plans & main.INPUT_RIGHT) != 0
+    moves = (right.astype(numpy.float32) - left) * player.speed
+    jumps = (plans & main.INPUT_JUMP) != 0
+    pressed = numpy.where(left | right, numpy.arange(1, LOOKAHEAD + 1), 0)
+    last = numpy.maximum.accumulate(pressed, axis=1)
+    facing = numpy.where(last > 0, right[numpy.arange(count)[:, None], last - 1], not player.facing_left)
+    for step in range(LOOKAHEAD):
+        move = moves[:, step]
+        # Rect坐标是整数，赋值时向零截断
+        x = numpy.trunc(numpy.maximum(0, x + numpy.where(jumping, move * player.air_control, move)))
+        start = jumps[:, step] & ~jumping
+        velocity_y = numpy.where(start, main.JUMP_SPEED, velocity_y)
+        jumping = jumping | start
+        prev_bottom = y + height
+        velocity_y = velocity_y + main.GRAVITY
+        y = y + velocity_y
+        grounded = y > bottom
+        y = numpy.where(grounded, bottom, y)
+        velocity_y = numpy.where(grounded, 0, velocity_y)
+        jumping = jumping & ~grounded
+        if platforms:
+            # 和World.land一样落到第一块满足条件的平台上，所有平台一起判断
+            eligible = ((velocity_y >= 0) & (prev_bottom <= tops) & (tops <= y + height) &
+                        (x + width > lefts) & (x < rights))
+            landed = eligible.any(axis=0)
+            y = numpy.where(landed, tops[eligible.argmax(axis=0), 0] - height, y)
+            velocity_y = numpy.where(landed, 0, velocity_y)
+            jumping = jumping & ~landed
+        xs[:, step] = x
+        ys[:, step] = y
+    return xs, ys, facing
+
+def stacked(pool, indices):
+    # 同一轮发射的追踪弹完全重合，只推演其中一颗，返回保留的下标和每颗代表的数量
+    rows = numpy.stack([getattr(pool, name)[indices] for name in ('x', 'y', 'speed_x', 'speed_y', 'lifetime', 'size')],
+                       axis=1)
+    _, first, counts = numpy.unique(rows, axis=0, return_index=True, return_counts=True)
+    return indices[first], counts
+
+class IdleBot:
+    # 对照组：BOSS出现前一直向右跑，之后站着不动面朝BOSS自动射击
+    def __call__(self, sim):
+        return 0 if sim.boss.has_appeared else main.INPUT_RIGHT
+
+class DodgeBot:
+    # 脚本化的躲避机器人：先把投射物和小兵向前推演LOOKAHEAD步，
+    # 再推演所有候选操作序列下玩家的位置，按“预计命中次数”减去“面向BOSS射击的步数”、
+    # 加上“退到世界左端无处可躲的步数”打分，按得分最低的序列操作。
+    # 推演是精确的，所以只在出现新的投射物或小兵、或者沿用了REPLAN_STEPS步之后才重新规划，
+    # 其余的步按序列执行，平均每步的开销和模拟本身在同一个量级。
+    # 候选序列包括固定的两段式序列（见build_plans）、当前的最优序列以及它的随机变体，
+    # 躲开追踪弹这类需要几十步的机动可以逐步完善。
+    # 每一步有lapse的概率“走神”，沿用上一步的操作；随机数都来自战斗的种子
+    def __init__(self, seed, lapse=0.1):
+        self.rng = random.Random(seed)
+        self.mutation_rng = numpy.random.default_rng(seed)
+        self.lapse = lapse
+        self.last = 0
+        self.plan = None  # 当前的最优序列，第一个元素是这一步的操作
+        self.age = 0  # 距上次规划的步数
+        self.seen = None  # 上次规划时两个池的发射总数、小兵数量和BOSS是否出现
+        self.scratch = main.ProjectilePool()  # 推演投射物用的草稿池
+
+    def __call__(self, sim):
+        if self.plan is not None:
+            # 序列后移一步，对齐到这一步
+            self.plan = numpy.append(self.plan[1:], self.plan[-1])
+            self.age += 1
+        if self.rng.random() >= self.lapse:
+            self.last = self.choose(sim)
+        return self.last
+
+    def predict(self, sim, xs, ys):
+        # 两个投射物池一起放进草稿池，按真实的运动模型（含正弦摆动和追踪转向）向前推演LOOKAHEAD步。
+        # 普通投射物各放一份；追踪弹追着玩家转向，按每个候选序列各复制一份，目标是该序列下玩家的中心。
+        # 返回 (fixed, homing)，各为 (left, top, right, bottom, 数量)，碰撞盒以(x, y)为左上角、
+        # 宽size*2、高size（见ProjectilePool.bounds），四周留一点余量；
+        # fixed的包围盒形状为 (LOOKAHEAD, n)，homing的为 (序列数, LOOKAHEAD, m)
+        plans = len(xs)
+        fixed, chasing, counts = [], [], []
+        for pool in (sim.boss.projectiles, sim.entities.projectiles):
+            kind = pool.kind[:pool.count]
+            fixed.append((pool, numpy.flatnonzero(kind != main.PROJ_HOMING)))
+            indices, stack = stacked(pool, numpy.flatnonzero(kind == main.PROJ_HOMING))
+            chasing.append((pool, indices))
+            counts.append(stack)
+        counts = numpy.concatenate(counts)
+        f = sum(len(indices) for _, indices in fixed)
+        m = len(counts)
+        n = f + m * plans
+        if self.scratch.capacity < n:
+            self.scratch = main.ProjectilePool(n)
+        scratch = self.scratch
+        for name in scratch.FIELDS:
+            column = getattr(scratch, name)
+            column[:f] = numpy.concatenate([getattr(pool, name)[indices] for pool, indices in fixed])
+            if m:
+                # 按序列排列：第p个序列的追踪弹位于 f + p*m 开始的m个位置
+                column[f:n] = numpy.tile(numpy.concatenate([getattr(pool, name)[indices] for pool, indices in chasing]),
+                                         plans)
+        scratch.count = n
+        width, height = sim.player.rect.size
+        target_x = numpy.repeat(xs.T + width / 2, m, axis=1) if m else None
+        target_y = numpy.repeat(ys.T + height / 2, m, axis=1) if m else None
+        box_x = numpy.empty((LOOKAHEAD, n), numpy.float32)
+        box_y = numpy.empty((LOOKAHEAD, n), numpy.float32)
+        dead = numpy.zeros(n, bool)
+        for step in range(LOOKAHEAD):
+            x = scratch.x[:n]
+            y = scratch.y[:n]
+            x += scratch.speed_x[:n]
+            y += scratch.speed_y[:n]
+            scratch.motion.apply(scratch, (target_x[step], target_y[step]) if m else None)
+            scratch.lifetime[:n] += 1
+            # 和ProjectilePool.update一样剔除飞出屏幕或超时的投射物（相机按不动算），之后不再参与碰撞
+            dead |= ((x < sim.camera_x - 100) | (x > sim.camera_x + main.WINDOW_WIDTH + 100) |
+                     (y < -100) | (y > main.WINDOW_HEIGHT + 100) | (scratch.lifetime[:n] >= scratch.max_lifetime))
+            box_x[step] = numpy.where(dead, numpy.nan, x)
+            box_y[step] = y
+        size = scratch.size[:n]
+        left, top, right, bottom = box_x - 4, box_y - 4, box_x + size * 2 + 4, box_y + size + 4
+        homing = tuple(side[:, f:].reshape(LOOKAHEAD, plans, m).transpose(1, 0, 2)
+                       for side in (left, top, right, bottom))
+        return (left[:, :f], top[:, :f], right[:, :f], bottom[:, :f], numpy.ones(f)), (*homing, counts)
+
+    def minions(self, sim):
+        # 小兵按当前速度匀速移动，包围盒形状为 (LOOKAHEAD, n)
+        store = sim.entities.store
+        n = store.count
+        steps = numpy.arange(1, LOOKAHEAD + 1, dtype=numpy.float32)[:, None]
+        left = store.x[:n] + store.speed_x[:n] * steps
+        top = store.y[:n] + store.speed_y[:n] * steps
+        return left - 4, top - 4, left + store.width[:n] + 4, top + store.height[:n] + 4, numpy.ones(n)
+
+    def candidates(self):
+        if self.plan is None:
+            return PLANS
+        carried = self.plan
+        rng = self.mutation_rng
+        mutants = numpy.repeat(carried[None], MUTATIONS, axis=0)
+        starts = rng.integers(0, LOOKAHEAD, MUTATIONS)
+        lengths = rng.integers(1, LOOKAHEAD // 2, MUTATIONS)
+        actions = rng.choice(ACTIONS, MUTATIONS)
+        for row, start, length, action in zip(mutants, starts, lengths, actions):
+            row[start:start + length] = action
+        return numpy.concatenate([PLANS, carried[None], mutants])
+
+    def choose(self, sim):
+        player = sim.player
+        appeared = sim.boss.has_appeared
+        seen = (sim.boss.projectiles.spawned, sim.entities.projectiles.spawned, sim.entities.store.count, appeared)
+        if self.plan is not None and seen == self.seen and self.age < REPLAN_STEPS:
+            return int(self.plan[0])
+        self.seen = seen
+        self.age = 0
+        if not (sim.boss.projectiles.count or sim.entities.projectiles.count or sim.entities.store.count):
+            self.plan = None
+            if not appeared:
+                return main.INPUT_RIGHT
+            return main.INPUT_RIGHT if player.facing_left else 0
+        platforms = [platform for chunk in sim.world.nearby(player.rect) for platform in chunk.platforms]
+        plans = self.candidates()
+        xs, ys, facing = predict_paths(player, platforms, plans)
+        width, height = player.rect.size
+        # 模拟用连续碰撞检测，这里把玩家每一步的盒子扩展到包含上一步的位置
+        prev_x = numpy.concatenate([numpy.full((len(xs), 1), player.rect.x, numpy.float32), xs[:, :-1]], axis=1)
+        prev_y = numpy.concatenate([numpy.full((len(ys), 1), player.rect.y, numpy.float32), ys[:, :-1]], axis=1)
+        player_left = numpy.minimum(xs, prev_x)
+        player_top = numpy.minimum(ys, prev_y)
+        player_right = numpy.maximum(xs, prev_x) + width
+        player_bottom = numpy.maximum(ys, prev_y) + height
+
+        fixed, homing = self.predict(sim, xs, ys)
+        if sim.entities.store.count:
+            fixed = tuple(numpy.concatenate(sides, axis=-1) for sides in zip(fixed, self.minions(sim)))
+        # 只保留任何一个序列都可能碰到的危险物
+        left, top, right, bottom, counts = fixed
+        near = ((right > player_left.min(axis=0)[:, None]) & (left < player_right.max(axis=0)[:, None]) &
+                (bottom > player_top.min(axis=0)[:, None]) & (top < player_bottom.max(axis=0)[:, None])).any(axis=0)
+        fixed = tuple(side[..., near] for side in fixed)
+        score = numpy.zeros(len(plans))
+        player_box = (player_left[:, :, None], player_top[:, :, None],
+                      player_right[:, :, None], player_bottom[:, :, None])
+        for left, top, right, bottom, counts in (fixed, homing):
+            if len(counts):
+                score += (((right > player_box[0]) & (left < player_box[2]) &
+                           (bottom > player_box[1]) & (top < player_box[3])) @ counts).sum(axis=1)
+        # 退到世界左端后就没有后退躲避的余地
+        score += CORNER_WEIGHT * (xs < CORNER_X).sum(axis=1)
+        if appeared:
+            # BOSS总在玩家右边，面朝右时自动射击才能打中它
+            score -= FIRE_WEIGHT * facing.sum(axis=1)
+        else:
+            score -= PROGRESS_WEIGHT * (xs[:, -1] - player.rect.x) / player.speed
+        self.plan = plans[int(numpy.argmin(score))]
+        return int(self.plan[0])
+
+BOTS = ('dodge', 'idle')
+
+def run_fight(task):
+    params, seed, max_steps, lapse, bot_name = task
+    sim = main.Simulation(assets, seed=seed)
+    bot = DodgeBot(seed, lapse) if bot_name == 'dodge' else IdleBot()
+    boss = sim.boss
+    boss.health = boss.max_health = params['boss_health']
+    boss.attack_delay = boss.attack_wait = params['attack_delay']
+    boss.projectile_speed = params['projectile_speed']
+    sim.player.bullet_damage = params['bullet_damage']
+    start_health = sim.player.health
+
+    peak = 0
+    appeared = None
+    while sim.result is None and sim.frame < max_steps:
+        sim.step(bot(sim))
+        if appeared is None and boss.has_appeared:
+            appeared = sim.time
+        peak = max(peak, len(boss.projectiles))
+    return {
+        **params,
+        'bot': bot_name,
+        'seed': seed,
+        'result': sim.result or 'TIMEOUT',
+        'time_to_kill_s': round((sim.time - appeared) / 1000, 2) if sim.result == 'WIN' else None,
+        'survival_s': round((sim.time - appeared) / 1000, 2) if appeared is not None else 0,
+        'damage_dealt': boss.max_health - max(boss.health, 0),
+        'damage_taken': start_health - sim.player.health,
+        'peak_projectiles': peak,
+        'steps': sim.frame,
+    }
+
+def aggregate(rows, key=PARAMS):
+    # 同一参数组合（或者key指定的其他列）的所有种子合并为一行
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(row[name] for name in key), []).append(row)
+    summary = []
+    for values, fights in groups.items():
+        kills = [fight['time_to_kill_s'] for fight in fights if fight['time_to_kill_s'] is not None]
+        summary.append({
+            **dict(zip(key, values)),
+            'bot': fights[0]['bot'],
+            'fights': len(fights),
+            'win_rate': round(len(kills) / len(fights), 3),
+            'timeouts': sum(fight['result'] == 'TIMEOUT' for fight in fights),
+            'time_to_kill_s': round(sum(kills) / len(kills), 2) if kills else '',
+            'survival_s': round(sum(fight['survival_s'] for fight in fights) / len(fights), 2),
+            'damage_dealt': round(sum(fight['damage_dealt'] for fight in fights) / len(fights), 1),
+            'damage_taken': round(sum(fight['damage_taken'] for fight in fights) / len(fights), 1),
+            'peak_projectiles': max(fight['peak_projectiles'] for fight in fights),
+        })
+    return summary
+
+def default_params():
+    # 游戏里的默认参数
+    sim = main.Simulation(assets)
+    return {'boss_health': sim.boss.max_health, 'attack_delay': sim.boss.attack_delay,
+            'projectile_speed': sim.boss.projectile_speed, 'bullet_damage': sim.player.bullet_damage}
+
+def check(rows):
+    # 默认参数下躲避机器人必须比原地不动的基线活得更久、对BOSS造成更多伤害，否则扫描结果没有参考价值
+    summary = {row['bot']: row for row in aggregate(rows, key=('bot',))}
+    for name, row in summary.items():
+        print(f"  {name}: win_rate={row['win_rate']}  survival_s={row['survival_s']}  "
+              f"damage_dealt={row['damage_dealt']}  damage_taken={row['damage_taken']}")
+    dodge, idle = summary['dodge'], summary['idle']
+    return (dodge['win_rate'] >= idle['win_rate'] and dodge['survival_s'] > idle['survival_s'] and
+            dodge['damage_dealt'] > idle['damage_dealt'])
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='Trump VS BOSS batch fights')
+    parser.add_argument('--boss-health', type=int, nargs='+', default=[400])
+    parser.add_argument('--attack-delay', type=int, nargs='+', default=[400, 600, 800])
+    parser.add_argument('--projectile-speed', type=float, nargs='+', default=[6, 8, 10])
+    parser.add_argument('--bullet-damage', type=int, nargs='+', default=[5])
+    parser.add_argument('--seeds', type=int, default=8, help='每个参数组合的战斗次数')
+    parser.add_argument('--bot', choices=BOTS, default='dodge', help='操作玩家的机器人')
+    parser.add_argument('--check', action='store_true',
+                        help='只在默认参数下对比躲避机器人和原地不动的基线，躲避机器人不占优时返回非零')
+    parser.add_argument('--lapse', type=float, default=0.1, help='机器人每步走神（沿用上一步操作）的概率')
+    parser.add_argument('--max-steps', type=int, default=main.FPS * 180, help='单场战斗的步数上限')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='工作进程数')
+    parser.add_argument('--out', default='fight_sweep.csv', help='汇总结果CSV')
+    parser.add_argument('--raw', help='另外保存每场战斗的结果CSV')
+    args = parser.parse_args()
+
+    if args.check:
+        init_worker()
+        tasks = [(default_params(), seed, args.max_steps, args.lapse, bot)
+                 for bot in ('dodge', 'idle') for seed in range(args.seeds)]
+    else:
+        grid = itertools.product(args.boss_health, args.attack_delay,
+                                 args.projectile_speed, args.bullet_damage)
+        tasks = [(dict(zip(PARAMS, values)), seed, args.max_steps, args.lapse, args.bot)
+                 for values in grid for seed in range(args.seeds)]
+
+    start = time.perf_counter()
+    # 用spawn启动工作进程，避免fork已经初始化过的SDL
+    context = multiprocessing.get_context('spawn')
+    pool = context.Pool(args.workers, initializer=init_worker)
+    try:
+        rows = pool.map(run_fight, tasks, chunksize=max(1, len(tasks) // (args.workers * 4)))
+    finally:
+        # SDL接管了SIGTERM，Pool.terminate结束不了工作进程，只能让它们正常退出
+        pool.close()
+        pool.join()
+    elapsed = time.perf_counter() - start
+
+    if args.check:
+        print(f'{len(rows)} fights at the default parameters in {elapsed:.1f}s')
+        passed = check(rows)
+        print('check ' + ('passed' if passed else 'FAILED: the dodge bot does no better than standing still'))
+        sys.exit(0 if passed else 1)
+
+    summary = aggregate(rows)
+    write_csv(args.out, summary)
+    if args.raw:
+        write_csv(args.raw, rows)
+    steps = sum(row['steps'] for row in rows)
+    print(f'{len(rows)} fights ({steps} steps) in {elapsed:.1f}s on {args.workers} workers -> {args.out}')
+    for row in summary:
+        print('  ' + '  '.join(f'{name}={row[name]}' for name in row))
+
+if __name__ == '__main__':
+    main_cli()